@@ -32,7 +32,7 @@ class FingerprintImageAdmin(admin.ModelAdmin):
 
 @admin.register(ModelVersion)
 class ModelVersionAdmin(admin.ModelAdmin):
-    list_display = ('version_number', 'release_date', 'accuracy_score', 'is_active', 'framework_used')
+    list_display = ('version_number', 'release_date', 'accuracy_score', 'is_active', 'framework_used', 'artifact_path')
     list_filter = ('is_active', 'release_date', 'framework_used')
     search_fields = ('version_number', 'training_dataset')
 
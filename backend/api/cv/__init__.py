@@ -0,0 +1,6 @@
+"""
+Array-level fingerprint algorithms used by ``api.image_processing``.
+
+The modules here work on NumPy images only (no Django, no storage) so they
+can be reused by the analysis views, management commands and benchmarks.
+"""
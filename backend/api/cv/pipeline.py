@@ -0,0 +1,163 @@
+"""
+Lazily evaluated stage graph for per-request image pipelines.
+
+A :class:`StageGraph` declares named stages and the stages they consume.  A
+:class:`PipelineRun` evaluates stages on demand and memoises their results,
+so an intermediate such as the denoised image is computed once per request
+however many consumers ask for it.  Each stage's own run time (excluding its
+inputs) is recorded in :attr:`PipelineRun.timings`.
+
+:meth:`PipelineRun.evaluate` computes several stages at once on a thread
+pool, starting every stage as soon as its inputs are ready; independent
+branches (Gabor filtering, ridge fields, thinning) then overlap, since
+OpenCV and NumPy release the GIL.  The results are the same as evaluating
+the stages one by one.
+
+Stage pool, tile pool and OpenCV's own threads nest, so one request can
+occupy the product of their sizes; :func:`split_thread_budget` sizes them
+so that product stays within the process's thread budget.
+"""
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, ThreadPoolExecutor, wait
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+
+class StageGraph:
+    """Named stages and their dependencies."""
+
+    def __init__(self):
+        self._stages: Dict[str, Tuple[Callable[..., Any], Tuple[str, ...]]] = {}
+
+    def add(self, name: str, func: Callable[..., Any], *inputs: str) -> None:
+        """Register *func* as stage *name*, called with the values of *inputs*."""
+        if name in self._stages:
+            raise ValueError(f"Stage {name!r} is already defined")
+        self._stages[name] = (func, inputs)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._stages
+
+    def dependencies(self, name: str) -> Tuple[str, ...]:
+        return self._stages[name][1]
+
+    def run(self, **values: Any) -> "PipelineRun":
+        """Start a run seeded with *values* (e.g. the image path)."""
+        return PipelineRun(self, values)
+
+
+class PipelineRun:
+    """One evaluation of a :class:`StageGraph`; results are cached per run."""
+
+    def __init__(self, graph: StageGraph, values: Dict[str, Any]):
+        self.graph = graph
+        self._values = dict(values)
+        self.timings: Dict[str, float] = {}
+
+    def __getitem__(self, name: str) -> Any:
+        if name in self._values:
+            return self._values[name]
+        if name not in self.graph:
+            raise KeyError(f"Unknown pipeline stage {name!r}")
+        func, inputs = self.graph._stages[name]
+        args = [self[dep] for dep in inputs]
+        start = time.perf_counter()
+        value = func(*args)
+        self.timings[name] = round((time.perf_counter() - start) * 1000, 2)
+        self._values[name] = value
+        return value
+
+    def __contains__(self, name: str) -> bool:
+        """Whether *name* has already been computed (or was given)."""
+        return name in self._values
+
+    def _missing(self, names: Iterable[str]) -> List[str]:
+        """Stages needed for *names* that are not computed yet, inputs first."""
+        order: List[str] = []
+        seen = set()
+
+        def visit(name: str) -> None:
+            if name in seen or name in self._values:
+                return
+            if name not in self.graph:
+                raise KeyError(f"Unknown pipeline stage {name!r}")
+            seen.add(name)
+            for dep in self.graph.dependencies(name):
+                visit(dep)
+            order.append(name)
+
+        for name in names:
+            visit(name)
+        return order
+
+    def evaluate(self, names: Iterable[str], executor: Optional[Executor] = None) -> Dict[str, Any]:
+        """
+        Compute *names* and everything they need; with an *executor*,
+        independent stages run concurrently.  Returns ``{name: value}``.
+
+        The calling thread only schedules: a stage is submitted once all its
+        inputs are available, so pool threads never wait on each other.
+        """
+        names = list(names)
+        pending = self._missing(names)
+        if executor is None or len(pending) < 2:
+            return {name: self[name] for name in names}
+
+        def call(name: str, args: list):
+            start = time.perf_counter()
+            value = self.graph._stages[name][0](*args)
+            return value, round((time.perf_counter() - start) * 1000, 2)
+
+        running = {}
+        try:
+            while pending or running:
+                for name in [n for n in pending if all(d in self._values for d in self.graph.dependencies(n))]:
+                    args = [self._values[dep] for dep in self.graph.dependencies(name)]
+                    running[executor.submit(call, name, args)] = name
+                    pending.remove(name)
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    self._values[name], self.timings[name] = future.result()
+        finally:
+            # Let stages already started finish before an error propagates
+            wait(running)
+        return {name: self._values[name] for name in names}
+
+    def total_ms(self) -> float:
+        return round(sum(self.timings.values()), 2)
+
+
+
+@lru_cache(maxsize=4)
+def get_stage_pool(workers: int) -> Optional[ThreadPoolExecutor]:
+    """Process-wide pool for :meth:`PipelineRun.evaluate`; ``None`` for one worker."""
+    if workers <= 1:
+        return None
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='cv-stage')
+
+
+class ThreadShares(NamedTuple):
+    """Threads of each nested pool; their product is at most the budget."""
+
+    stages: int
+    tiles: int
+    opencv: int
+
+
+def split_thread_budget(budget: int, parallel_stages: bool, tile_workers: int = 0) -> ThreadShares:
+    """
+    Divide *budget* threads among the stage pool, the tile pool and OpenCV.
+
+    An explicit *tile_workers* (capped at the budget) is served first and the
+    stage pool gets what is left; otherwise parallel stages take the whole
+    budget and tiles run one at a time.  OpenCV keeps whatever the two pools
+    leave, one thread when they use the budget up.
+    """
+    budget = max(1, budget)
+    if tile_workers:
+        tiles = min(budget, tile_workers)
+    else:
+        tiles = 1 if parallel_stages else budget
+    stages = budget // tiles if parallel_stages else 1
+    return ThreadShares(stages, tiles, max(1, budget // (stages * tiles)))
@@ -0,0 +1,162 @@
+"""
+Coarse-to-fine front end: scale-normalised working image of a capture.
+
+Phone photos and high-resolution scanners deliver many more pixels than the
+ridge detail needs.  Before the pipeline proper runs, the capture is reduced
+by powers of two to a coarse level of at most ``coarse_size`` pixels a side,
+where finding the fingerprint is cheap:
+
+    segmentation    block-variance foreground of the coarse level; captures
+                    without usable foreground stop here
+    ridge period    block ridge frequency of a window at the foreground
+                    centre, taken at the first pyramid level where the ridges
+                    fall inside the estimator's range
+
+The pipeline then works on the foreground region only, resampled so ridges
+are ``target_period`` pixels apart (about 9 px at 500 dpi).  Its cost follows
+the size of the fingerprint, not the camera's megapixels.  Captures already at
+or below the target spacing are not resampled; small captures are used as
+they are.
+"""
+from typing import NamedTuple, Tuple
+
+import cv2
+import numpy as np
+
+from .fields import compute_ridge_fields
+from .segmentation import segment_foreground
+
+DEFAULT_TARGET_RIDGE_PERIOD = 9.0
+DEFAULT_COARSE_SIZE = 512
+# Working images are never shrunk below this fraction of the capture, nor
+# resampled for a change of less than _MIN_RESAMPLE
+MIN_WORKING_SCALE = 0.2
+_MIN_RESAMPLE = 0.85
+# Foreground narrower than this many working pixels is not a usable print
+MIN_FOREGROUND_SIDE = 64
+
+# Ridge period estimation window (pixels of the level it is measured on),
+# the periods trusted at one level and the share of blocks that must agree
+_PERIOD_WINDOW = 256
+_PERIOD_RANGE = (5.0, 18.0)
+_MIN_VALID_BLOCKS = 0.3
+_PERIOD_LEVELS = 4
+
+
+class WorkingImage(NamedTuple):
+    """Foreground region of a capture at the pipeline's working scale."""
+
+    image: np.ndarray  # uint8 region, resampled by scale
+    region: Tuple[int, int, int, int]  # y0, y1, x0, x1 of the region in the capture
+    scale: float  # working pixels per capture pixel (<= 1)
+    ridge_period: float  # capture pixels between ridges, 0 when unknown
+    coarse_factor: int  # reduction of the coarse level
+    foreground: bool  # the coarse level found a usable print
+
+    @property
+    def origin(self) -> Tuple[int, int]:
+        """``(x, y)`` of the region's top-left corner in the capture."""
+        return self.region[2], self.region[0]
+
+    def frame_xy(self, x, y, offset: Tuple[int, int] = (0, 0)):
+        """Capture coordinates of working-image *x*, *y* (scalars or arrays) plus *offset*."""
+        dx, dy = offset
+        ox, oy = self.origin
+        return np.round((x + dx) / self.scale) + ox, np.round((y + dy) / self.scale) + oy
+
+    def to_frame(self, points: np.ndarray, offset: Tuple[int, int] = (0, 0)) -> np.ndarray:
+        """Copy of structured *points* with x/y moved from the working image to the capture."""
+        if tuple(offset) == (0, 0) and self.origin == (0, 0) and self.scale == 1.0:
+            return points
+        mapped = points.copy()
+        mapped['x'], mapped['y'] = self.frame_xy(points['x'], points['y'], offset)
+        return mapped
+
+    def frame_bbox(self, bbox: Tuple[int, int, int, int]) -> Tuple[int, int, int, int]:
+        """Working-image ``(y0, y1, x0, x1)`` box in capture pixels."""
+        ry0, ry1, rx0, rx1 = self.region
+        y0, y1, x0, x1 = (int(round(v / self.scale)) for v in bbox)
+        return ry0 + y0, min(ry1, ry0 + y1), rx0 + x0, min(rx1, rx0 + x1)
+
+    def place(self, img: np.ndarray, shape: tuple, fill: int = 255) -> np.ndarray:
+        """Working-scale *img* of the whole region, put back in a capture-sized frame."""
+        y0, y1, x0, x1 = self.region
+        if img.shape[:2] != (y1 - y0, x1 - x0):
+            img = cv2.resize(img, (x1 - x0, y1 - y0), interpolation=cv2.INTER_LINEAR)
+        if img.shape == shape:
+            return img
+        frame = np.full(shape, fill, dtype=img.dtype)
+        frame[y0:y1, x0:x1] = img
+        return frame
+
+
+def coarse_level(img: np.ndarray, max_side: int = DEFAULT_COARSE_SIZE) -> Tuple[np.ndarray, int]:
+    """``(level, factor)``: *img* halved with ``cv2.pyrDown`` until no side exceeds *max_side*."""
+    level, factor = img, 1
+    while max(level.shape[:2]) > max_side and min(level.shape[:2]) >= 64:
+        level = cv2.pyrDown(level)
+        factor *= 2
+    return level, factor
+
+
+def estimate_ridge_period(img: np.ndarray, centre: Tuple[int, int], window: int = _PERIOD_WINDOW) -> float:
+    """
+    Ridge period in pixels of *img* around ``(x, y)`` *centre*, 0 when none is found.
+
+    Each attempt takes a window twice as wide, halved once more, so the
+    estimate always costs one *window*-sized ridge field.  The first level at
+    which enough blocks agree on a period inside the trusted range wins.
+    """
+    h, w = img.shape[:2]
+    cx, cy = centre
+    for level in range(_PERIOD_LEVELS):
+        half = (window << level) // 2
+        y0, x0 = max(0, min(cy - half, h - 2 * half)), max(0, min(cx - half, w - 2 * half))
+        sample = img[y0:y0 + 2 * half, x0:x0 + 2 * half]
+        for _ in range(level):
+            sample = cv2.pyrDown(sample)
+        if min(sample.shape) < 64:
+            break
+        fields = compute_ridge_fields(sample)
+        valid = fields.frequency[fields.frequency > 0]
+        if valid.size < _MIN_VALID_BLOCKS * fields.frequency.size:
+            continue
+        period = 1.0 / float(np.median(valid))
+        if _PERIOD_RANGE[0] <= period <= _PERIOD_RANGE[1]:
+            return period * (1 << level)
+    return 0.0
+
+
+def build_working_image(img: np.ndarray, target_period: float = DEFAULT_TARGET_RIDGE_PERIOD,
+                        coarse_size: int = DEFAULT_COARSE_SIZE) -> WorkingImage:
+    """Working image of the grayscale capture *img* (see the module docstring)."""
+    h, w = img.shape
+    coarse, factor = coarse_level(img, coarse_size)
+    segmentation = segment_foreground(coarse, block=16 if factor == 1 else 8)
+
+    cy0, cy1, cx0, cx1 = segmentation.bbox
+    region = (cy0 * factor, min(h, cy1 * factor), cx0 * factor, min(w, cx1 * factor))
+    centre = ((region[2] + region[3]) // 2, (region[0] + region[1]) // 2)
+    period = estimate_ridge_period(img, centre) if segmentation.found else 0.0
+
+    scale = 1.0
+    if period > 0:
+        scale = max(MIN_WORKING_SCALE, min(1.0, target_period / period))
+        if scale > _MIN_RESAMPLE:
+            scale = 1.0
+
+    if factor == 1 and scale == 1.0:
+        # Nothing to gain; the pipeline segments the capture itself
+        region, working = (0, h, 0, w), img
+    else:
+        y0, y1, x0, x1 = region
+        working = img[y0:y1, x0:x1]
+        if scale < 1.0:
+            size = (max(1, int(round((x1 - x0) * scale))), max(1, int(round((y1 - y0) * scale))))
+            working = cv2.resize(working, size, interpolation=cv2.INTER_AREA)
+            # Map working pixels exactly onto the region
+            scale = size[0] / (x1 - x0)
+
+    area = int(segmentation.mask.sum()) * (segmentation.block_size * factor * scale) ** 2
+    foreground = segmentation.found and area >= MIN_FOREGROUND_SIDE ** 2
+    return WorkingImage(np.ascontiguousarray(working), region, float(scale), float(period), factor, foreground)
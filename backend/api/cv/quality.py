@@ -0,0 +1,230 @@
+"""
+Image quality metrics of the preprocessing pipeline, in float32.
+
+    sharpness      variance of the Laplacian
+    contrast       standard deviation of the intensities
+    brightness     mean intensity
+    noise_level    mean absolute difference between original and processed
+    ridge_clarity  percentage of pixels whose gradient magnitude exceeds the
+                   75th percentile
+
+Derivatives of 8-bit images are integers, so the float32 Laplacian and the
+squared Sobel magnitude ``gx² + gy²`` (< 2**24) are exact; squares keep the
+ordering of magnitudes without a square root.  Two buffers are reused for
+the Laplacian and both gradients.  Means and variances come from
+``cv2.meanStdDev``, which accumulates in double precision, and the 75th
+percentile from a fixed-bin histogram refined inside the one bin that holds
+it, instead of a partition of the whole image.  The rounded figures are the
+ones the float64 NumPy formulation gives.
+
+:func:`block_quality_map` grades every block of the ridge-field grid, in the
+spirit of NFIQ's local features:
+
+    orientation certainty    coherence of the block's structure tensor
+    ridge-valley clarity     share of the block's variance explained by its
+                             mean intensity profile across the ridges
+    frequency consistency    agreement of the block's ridge frequency with the
+                             median of its 3x3 neighbourhood, scaled by the
+                             orientation certainty (texture without ridge
+                             flow also has a steady frequency estimate)
+    foreground ratio         share of foreground blocks around it; blocks at
+                             the print's edge score lower
+
+The grid holds 0-100 per block as uint8; the overall score is its mean over
+the foreground blocks.
+"""
+import base64
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .fields import RidgeFields
+
+CLARITY_PERCENTILE = 75.0
+_HISTOGRAM_BINS = 1024
+
+# Weights of the block features in the block quality
+ORIENTATION_WEIGHT = 0.4
+CLARITY_WEIGHT = 0.4
+FREQUENCY_WEIGHT = 0.2
+
+
+def _mean_std(img: np.ndarray) -> Tuple[float, float]:
+    mean, std = cv2.meanStdDev(img)
+    return float(mean[0, 0]), float(std[0, 0])
+
+
+def _select(values: np.ndarray, k: int, bins: int) -> Tuple[float, int, np.ndarray]:
+    """``(value, below, members)``: the *k*-th smallest value, the count below its bin and the bin's values."""
+    flat = values.reshape(-1)
+    top = float(flat.max())
+    if top <= 0.0:
+        return 0.0, 0, flat
+    upper = float(np.nextafter(np.float32(top), np.float32(np.inf)))
+    hist = cv2.calcHist([values], [0], None, [bins], [0.0, upper]).ravel()
+    b = int(np.searchsorted(np.cumsum(hist), k + 1))
+    # calcHist and a comparison may put values at a bin edge on different
+    # sides; widen the bin by one step and count what lies below it exactly
+    lo = np.nextafter(np.float32(upper * b / bins), np.float32(0))
+    hi = np.nextafter(np.float32(upper * (b + 1) / bins), np.float32(np.inf))
+    below = int(np.count_nonzero(flat < lo))
+    members = flat[(flat >= lo) & (flat < hi)]
+    if not below <= k < below + members.size:
+        below, members = 0, flat
+    return float(np.partition(members, k - below)[k - below]), below, members
+
+
+def order_statistic(values: np.ndarray, k: int, bins: int = _HISTOGRAM_BINS) -> float:
+    """
+    The *k*-th smallest (0-based) of the non-negative float32 *values*.
+
+    A histogram locates the bin holding rank *k*; only that bin's values are
+    partitioned.
+    """
+    return _select(values, k, bins)[0]
+
+
+def ridge_clarity(img: np.ndarray, percentile: float = CLARITY_PERCENTILE,
+                  buffers: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> float:
+    """Percentage of pixels of 8-bit *img* with a gradient magnitude above its *percentile*."""
+    gx, gy = buffers if buffers is not None else (None, None)
+    gx = cv2.Sobel(img, cv2.CV_32F, 1, 0, dst=gx, ksize=3)
+    gy = cv2.Sobel(img, cv2.CV_32F, 0, 1, dst=gy, ksize=3)
+    energy = cv2.add(cv2.multiply(gx, gx, dst=gx), cv2.multiply(gy, gy, dst=gy), dst=gx)
+
+    # np.percentile interpolates between the order statistics at
+    # floor(q * (n - 1)) and the next one; no pixel lies strictly between
+    # them, so the pixels above the percentile are the pixels above the first
+    n = energy.size
+    threshold, below, members = _select(energy, int(np.floor(percentile / 100.0 * (n - 1))), _HISTOGRAM_BINS)
+    strong = n - below - int(np.count_nonzero(members <= threshold))
+    return min(100.0, strong / n * 100)
+
+
+def quality_metrics(original: np.ndarray, processed: np.ndarray) -> Dict[str, float]:
+    """Unrounded metrics of 8-bit *processed* against *original* (see the module docstring)."""
+    first = np.empty(processed.shape, np.float32)
+    second = np.empty_like(first)
+
+    _, laplacian_std = _mean_std(cv2.Laplacian(processed, cv2.CV_32F, dst=first))
+    brightness, contrast = _mean_std(processed)
+    # The merger scores an image against itself
+    noise_level = 0.0 if original is processed else cv2.mean(cv2.absdiff(original, processed))[0]
+
+    return {
+        'sharpness': laplacian_std ** 2,
+        'contrast': contrast,
+        'brightness': brightness,
+        'noise_level': noise_level,
+        'ridge_clarity': ridge_clarity(processed, buffers=(first, second)),
+    }
+
+
+class QualityMap(NamedTuple):
+    """Per-block quality of one image and the score derived from it."""
+
+    grid: np.ndarray  # (gh, gw) uint8, 0-100 per block, 0 on the background
+    block_size: int
+    score: float  # mean block quality over the foreground, 0-100
+    foreground_blocks: int
+    features: Optional[Dict[str, float]] = None  # foreground mean of each feature, 0-1
+
+    def usable(self, threshold: int) -> np.ndarray:
+        """Bool block grid of the blocks graded *threshold* or better."""
+        return self.grid >= threshold
+
+    def pixel_mask(self, threshold: int, shape: Tuple[int, int]) -> np.ndarray:
+        """uint8 pixel mask (1 = usable block) of an image of *shape* on this grid."""
+        b = self.block_size
+        grid = self.usable(threshold).view(np.uint8)
+        return np.repeat(np.repeat(grid, b, axis=0), b, axis=1)[:shape[0], :shape[1]]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Compact payload: the grid as base64 row-major uint8 bytes."""
+        rows, cols = self.grid.shape
+        return {
+            'block_size': self.block_size,
+            'rows': rows,
+            'cols': cols,
+            'grid': base64.b64encode(np.ascontiguousarray(self.grid).tobytes()).decode('ascii'),
+            'score': round(self.score, 2),
+            'foreground_blocks': self.foreground_blocks,
+            'features': {name: round(value, 3) for name, value in (self.features or {}).items()},
+        }
+
+
+def ridge_valley_clarity(img: np.ndarray, orientation: np.ndarray, block: int) -> np.ndarray:
+    """
+    Per-block clarity in [0, 1]: the share of the block's intensity variance
+    explained by its mean profile across the ridges.
+
+    Pixels are binned by their 1-pixel-wide offset along the ridge normal and
+    every bin replaced by its mean; averaging along the ridges cancels noise,
+    so clear ridges and valleys score close to 1 and texture without a ridge
+    flow close to 0 (about bins / pixels).
+    """
+    h, w = img.shape
+    gh, gw = orientation.shape
+    src = img.astype(np.float32).ravel()
+    ys, xs = np.divmod(np.arange(h * w, dtype=np.int32), w)
+    by, bx = ys // block, xs // block
+    cell = by * gw + bx
+
+    # Offset from the block centre along the normal (y down, angles counter-clockwise)
+    theta = orientation.ravel()[cell]
+    offset = (xs - bx * block - block / 2) * np.sin(theta) + (ys - by * block - block / 2) * np.cos(theta)
+    reach = int(np.ceil(block / np.sqrt(2)))
+    bins = 2 * reach + 1
+    index = cell * bins + np.clip(np.rint(offset).astype(np.int32) + reach, 0, bins - 1)
+
+    size = gh * gw
+    counts = np.bincount(index, minlength=size * bins).reshape(size, bins)
+    sums = np.bincount(index, weights=src, minlength=size * bins).reshape(size, bins)
+    n = counts.sum(axis=1)
+    total = sums.sum(axis=1)
+    square = np.bincount(cell, weights=src * src, minlength=size)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        centred = total * total / n
+        explained = (sums * sums / np.maximum(counts, 1)).sum(axis=1) - centred
+        clarity = explained / (square - centred)
+    clarity = np.where(square - centred > 1e-3 * n, clarity, 0.0)
+    return np.clip(clarity, 0.0, 1.0).reshape(gh, gw).astype(np.float32)
+
+
+def frequency_consistency(frequency: np.ndarray) -> np.ndarray:
+    """Per-block agreement in [0, 1] of the ridge frequency with its 3x3 median; 0 where unknown."""
+    median = cv2.medianBlur(frequency.astype(np.float32), 3)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        consistency = 1.0 - 2.0 * np.abs(frequency - median) / median
+    return np.where((frequency > 0) & (median > 0), np.clip(consistency, 0.0, 1.0), 0.0).astype(np.float32)
+
+
+def block_quality_map(img: np.ndarray, fields: RidgeFields, foreground: Optional[np.ndarray] = None) -> QualityMap:
+    """
+    Quality of every block of *fields*' grid over grayscale *img*.
+
+    *foreground* is a bool block grid of the same shape; without it every
+    block counts as foreground.
+    """
+    block = fields.block_size
+    if foreground is None:
+        foreground = np.ones(fields.shape, bool)
+    inside = foreground.astype(np.float32)
+    ratio = cv2.blur(inside, (3, 3), borderType=cv2.BORDER_REPLICATE) * inside
+
+    features = {
+        'orientation_certainty': np.clip(fields.coherence, 0.0, 1.0),
+        'ridge_valley_clarity': ridge_valley_clarity(img, fields.orientation, block),
+        'frequency_consistency': frequency_consistency(fields.frequency),
+        'foreground_ratio': ratio,
+    }
+    certainty = features['orientation_certainty']
+    quality = ratio * (ORIENTATION_WEIGHT * certainty
+                       + CLARITY_WEIGHT * features['ridge_valley_clarity']
+                       + FREQUENCY_WEIGHT * certainty * features['frequency_consistency'])
+    grid = np.rint(quality * 100).astype(np.uint8)
+    count = int(np.count_nonzero(foreground))
+    score = float(grid[foreground].mean()) if count else 0.0
+    means = {name: float(values[foreground].mean()) if count else 0.0 for name, values in features.items()}
+    return QualityMap(grid, block, score, count, means)
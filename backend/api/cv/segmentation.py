@@ -0,0 +1,96 @@
+"""
+Block-variance foreground segmentation of fingerprint captures.
+
+Blocks whose intensity standard deviation is high for this image (ridges)
+are foreground; flat paper, sensor margins and phone backgrounds are not.
+The block grid is cleaned up (closing, opening, largest region, holes
+filled) and a bounding box is taken around it, aligned to the block grid so
+block-level stages run on the crop share the same grid.
+"""
+from typing import NamedTuple, Tuple
+
+import cv2
+import numpy as np
+
+from .fields import DEFAULT_BLOCK_SIZE, block_mean
+
+# A block is foreground when its standard deviation exceeds this fraction
+# of the 95th percentile over all blocks, and never below the absolute floor
+_RELATIVE_STD = 0.25
+_MIN_STD = 6.0
+
+
+class Segmentation(NamedTuple):
+    """Foreground blocks of one image and the crop that contains them."""
+
+    mask: np.ndarray  # (gh, gw) bool block grid of the whole image
+    bbox: Tuple[int, int, int, int]  # y0, y1, x0, x1 in pixels; y0 and x0 on the block grid
+    block_size: int
+    found: bool = True  # False when no block stood out and the whole image is kept
+
+    @property
+    def offset(self) -> Tuple[int, int]:
+        """``(x, y)`` of the crop's top-left corner in the image."""
+        return self.bbox[2], self.bbox[0]
+
+    def crop(self, img: np.ndarray) -> np.ndarray:
+        y0, y1, x0, x1 = self.bbox
+        return img[y0:y1, x0:x1]
+
+    def block_mask(self) -> np.ndarray:
+        """Block grid of the crop (matches the grid of ridge fields computed on it)."""
+        y0, y1, x0, x1 = self.bbox
+        b = self.block_size
+        return self.mask[y0 // b:-(-y1 // b), x0 // b:-(-x1 // b)]
+
+    def pixel_mask(self) -> np.ndarray:
+        """uint8 pixel mask (1 = foreground) of the crop."""
+        y0, y1, x0, x1 = self.bbox
+        grid = self.block_mask().astype(np.uint8)
+        return np.repeat(np.repeat(grid, self.block_size, axis=0), self.block_size, axis=1)[:y1 - y0, :x1 - x0]
+
+
+def _fill_holes(mask: np.ndarray) -> np.ndarray:
+    """Mask with background regions that do not touch the grid edge filled in."""
+    n, labels = cv2.connectedComponents((~mask).view(np.uint8), connectivity=4)
+    edge = np.unique(np.concatenate((labels[0], labels[-1], labels[:, 0], labels[:, -1])))
+    outside = np.isin(labels, edge[edge > 0])
+    return mask | ~outside
+
+
+def _largest_region(mask: np.ndarray) -> np.ndarray:
+    n, labels, stats, _ = cv2.connectedComponentsWithStats(mask.view(np.uint8), connectivity=8)
+    if n <= 2:
+        return mask
+    largest = 1 + int(np.argmax(stats[1:, cv2.CC_STAT_AREA]))
+    return labels == largest
+
+
+def segment_foreground(img: np.ndarray, block: int = DEFAULT_BLOCK_SIZE) -> Segmentation:
+    """
+    Foreground blocks and bounding box of a grayscale *img*.
+
+    Falls back to the whole image when no block stands out, so callers can
+    always crop and mask.
+    """
+    h, w = img.shape
+    src = img.astype(np.float32)
+    mean = block_mean(src, block)
+    std = np.sqrt(np.maximum(block_mean(src * src, block) - mean * mean, 0.0))
+    threshold = max(_MIN_STD, _RELATIVE_STD * float(np.percentile(std, 95)))
+    mask = std > threshold
+
+    kernel = np.ones((3, 3), np.uint8)
+    grid = cv2.morphologyEx(mask.view(np.uint8), cv2.MORPH_CLOSE, kernel)
+    grid = cv2.morphologyEx(grid, cv2.MORPH_OPEN, kernel)
+    mask = grid.astype(bool)
+    if not mask.any():
+        return Segmentation(np.ones_like(mask), (0, h, 0, w), block, found=False)
+    mask = _fill_holes(_largest_region(mask))
+
+    # Box around the foreground with one block of margin
+    rows, cols = np.flatnonzero(mask.any(axis=1)), np.flatnonzero(mask.any(axis=0))
+    r0, r1 = max(0, rows[0] - 1), min(mask.shape[0], rows[-1] + 2)
+    c0, c1 = max(0, cols[0] - 1), min(mask.shape[1], cols[-1] + 2)
+    bbox = (int(r0 * block), int(min(h, r1 * block)), int(c0 * block), int(min(w, c1 * block)))
+    return Segmentation(mask, bbox, block)
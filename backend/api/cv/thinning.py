@@ -0,0 +1,78 @@
+"""
+Zhang-Suen thinning in NumPy, for installs without opencv-contrib.
+
+Each sub-iteration decides, for every candidate pixel at once, whether it is
+deletable by looking its packed 8-neighbour code up in a 256-entry table.  A
+pixel can only change its verdict when a neighbour was deleted, so after the
+first pass only the neighbours of the pixels deleted in the previous two
+sub-iterations are examined; the work follows the shrinking ridge border,
+not the image area.
+
+:func:`thin` uses ``cv2.ximgproc.thinning`` when opencv-contrib is installed
+and this implementation otherwise.
+"""
+import cv2
+import numpy as np
+
+from .minutiae import NEIGHBOUR_OFFSETS
+
+
+def _zhang_suen_luts():
+    """Deletable codes for the two sub-iterations (neighbours P2..P9 = N..NW)."""
+    codes = np.arange(256, dtype=np.uint8)
+    p = ((codes[:, None] >> np.arange(8, dtype=np.uint8)) & 1).astype(bool)
+    p2, p3, p4, p5, p6, p7, p8, p9 = p.T
+    count = p.sum(axis=1)
+    transitions = (~p & np.roll(p, -1, axis=1)).sum(axis=1)
+    base = (count >= 2) & (count <= 6) & (transitions == 1)
+    first = base & ~(p2 & p4 & p6) & ~(p4 & p6 & p8)
+    second = base & ~(p2 & p4 & p8) & ~(p2 & p6 & p8)
+    return first, second
+
+
+ZHANG_SUEN_LUTS = _zhang_suen_luts()
+
+
+def zhang_suen_thinning(binary: np.ndarray) -> np.ndarray:
+    """One-pixel-wide skeleton (0/255 uint8) of the non-zero pixels of *binary*."""
+    h, w = binary.shape
+    stride = w + 2
+    image = np.zeros((h + 2, w + 2), np.uint8)
+    image[1:-1, 1:-1] = binary > 0
+    flat = image.ravel()
+    offsets = np.array([dy * stride + dx for dy, dx in NEIGHBOUR_OFFSETS], np.intp)
+    weights = (1 << np.arange(8)).astype(np.uint8)
+
+    # Like cv2.ximgproc.thinning, pixels on the image border are never deleted
+    interior = np.zeros_like(image, dtype=bool)
+    interior[2:-2, 2:-2] = True
+    interior = interior.ravel()
+
+    ridge = np.flatnonzero(flat & interior)
+    current, previous = ridge, ridge[:0]
+    step = 0
+    while current.size:
+        codes = (flat[current[:, None] + offsets] * weights).sum(axis=1, dtype=np.uint8)
+        deleted = current[ZHANG_SUEN_LUTS[step % 2][codes]]
+        flat[deleted] = 0
+        if step == 0:
+            # The second sub-iteration has not seen any pixel yet
+            following = ridge[flat[ridge] > 0]
+        else:
+            # A pixel examined two sub-iterations ago keeps its verdict
+            # unless a neighbour was deleted since
+            changed = np.concatenate((previous, deleted))
+            following = np.unique((changed[:, None] + offsets).ravel())
+            following = following[(flat[following] > 0) & interior[following]]
+        current, previous = following, deleted
+        step += 1
+
+    return image[1:-1, 1:-1] * np.uint8(255)
+
+
+def thin(binary: np.ndarray) -> np.ndarray:
+    """Skeleton of *binary*, with opencv-contrib when available."""
+    contrib = getattr(getattr(cv2, 'ximgproc', None), 'thinning', None)
+    if contrib is not None:
+        return contrib(binary)
+    return zhang_suen_thinning(binary)
@@ -0,0 +1,154 @@
+"""
+Tiled, multi-threaded execution of image stages on large scans.
+
+A :class:`TileExecutor` splits an image into tiles of at most ``tile_size``
+pixels a side, grows each tile by a *halo* wide enough for the stage's
+filter support, runs the stage on the tiles in a thread pool (OpenCV and
+NumPy release the GIL) and writes each tile's interior into one output
+array.  Working memory is bounded by the tile size rather than the image;
+images no larger than one tile go straight through.
+
+With a halo at least as wide as the filter support the stitched output is
+identical to the whole-image result, so only local filters are tiled.
+Thinning is not: how far it reaches depends on the size of the blobs it
+erodes, so no fixed halo makes it seamless.  CLAHE is not a windowed
+filter, so :func:`tiled_clahe` tiles along its histogram grid instead.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from typing import Callable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+DEFAULT_TILE_SIZE = 1024
+
+Tile = Tuple[int, int, int, int]  # y0, y1, x0, x1
+
+
+class TileExecutor:
+    """Run per-tile stages across a shared thread pool."""
+
+    def __init__(self, tile_size: int = DEFAULT_TILE_SIZE, workers: Optional[int] = None):
+        if tile_size < 64:
+            raise ValueError("Tile size must be at least 64 pixels")
+        self.tile_size = tile_size
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='cv-tile')
+            return self._pool
+
+    def needs_tiling(self, shape: tuple) -> bool:
+        return self.workers > 1 and max(shape[-2:]) > self.tile_size
+
+    def tiles(self, height: int, width: int, step: Optional[int] = None) -> List[Tile]:
+        """Tile grid covering ``height x width`` with tiles of *step* pixels a side."""
+        step = step or self.tile_size
+        return [
+            (y0, min(y0 + step, height), x0, min(x0 + step, width))
+            for y0 in range(0, height, step)
+            for x0 in range(0, width, step)
+        ]
+
+    def run(self, func: Callable[[np.ndarray], np.ndarray], img: np.ndarray, tiles: List[Tile],
+            halo: int) -> np.ndarray:
+        """Apply *func* to every tile of *tiles* grown by *halo* and stitch the interiors."""
+        h, w = img.shape[:2]
+
+        def process(tile: Tile):
+            y0, y1, x0, x1 = tile
+            ry0, rx0 = max(0, y0 - halo), max(0, x0 - halo)
+            result = func(img[ry0:min(h, y1 + halo), rx0:min(w, x1 + halo)])
+            return tile, result[..., y0 - ry0:y1 - ry0, x0 - rx0:x1 - rx0]
+
+        out = None
+        for future in as_completed([self.pool.submit(process, tile) for tile in tiles]):
+            (y0, y1, x0, x1), interior = future.result()
+            if out is None:
+                out = np.empty(interior.shape[:-2] + (h, w), interior.dtype)
+            out[..., y0:y1, x0:x1] = interior
+        return out
+
+    def map(self, func: Callable[[np.ndarray], np.ndarray], img: np.ndarray, halo: int,
+            align: int = 1) -> np.ndarray:
+        """
+        ``func(img)`` computed tile by tile when *img* is larger than a tile.
+
+        *halo* is the filter support of *func* in pixels; it and the tile
+        size are rounded up to multiples of *align* for stages that resample
+        the image.
+        """
+        if not self.needs_tiling(img.shape):
+            return func(img)
+        halo = -(-halo // align) * align
+        step = -(-self.tile_size // align) * align
+        return self.run(func, img, self.tiles(*img.shape[:2], step=step), halo)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+
+@lru_cache(maxsize=4)
+def get_tile_executor(tile_size: int = DEFAULT_TILE_SIZE, workers: Optional[int] = None) -> TileExecutor:
+    """Process-wide :class:`TileExecutor` so the thread pool is shared by all requests."""
+    return TileExecutor(tile_size, workers)
+
+
+def tiled_clahe(executor: TileExecutor, img: np.ndarray, clip_limit: float = 2.0,
+                grid: Tuple[int, int] = (8, 8)) -> np.ndarray:
+    """
+    CLAHE with a *grid* of histogram cells over the whole image, computed in tiles.
+
+    Tiles are whole cells plus one cell of halo, which covers the bilinear
+    interpolation between neighbouring cell LUTs, so the result matches
+    ``cv2.createCLAHE(clip_limit, grid).apply(img)`` to within one grey
+    level (float rounding of the interpolation weights); ``benchmark_tiling.py``
+    checks this on sides that are and are not multiples of the grid.
+    """
+    if not executor.needs_tiling(img.shape):
+        return cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=grid).apply(img)
+
+    h, w = img.shape
+    cells_x, cells_y = grid
+    # Pad the bottom/right edges the way OpenCV does: nothing when both sides
+    # are multiples of the grid, otherwise grid - side % grid on *each* side,
+    # which is a full grid step for a side that already divides
+    pad_y = pad_x = 0
+    if h % cells_y or w % cells_x:
+        pad_y, pad_x = cells_y - h % cells_y, cells_x - w % cells_x
+    padded = cv2.copyMakeBorder(img, 0, pad_y, 0, pad_x, cv2.BORDER_REFLECT_101)
+    cell_h, cell_w = padded.shape[0] // cells_y, padded.shape[1] // cells_x
+    per_tile_y = max(1, executor.tile_size // cell_h)
+    per_tile_x = max(1, executor.tile_size // cell_w)
+
+    def process(cells: Tile):
+        cy0, cy1, cx0, cx1 = cells
+        hy0, hy1 = max(0, cy0 - 1), min(cells_y, cy1 + 1)
+        hx0, hx1 = max(0, cx0 - 1), min(cells_x, cx1 + 1)
+        region = padded[hy0 * cell_h:hy1 * cell_h, hx0 * cell_w:hx1 * cell_w]
+        clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(hx1 - hx0, hy1 - hy0))
+        result = clahe.apply(region)
+        oy, ox = (cy0 - hy0) * cell_h, (cx0 - hx0) * cell_w
+        return cells, result[oy:oy + (cy1 - cy0) * cell_h, ox:ox + (cx1 - cx0) * cell_w]
+
+    out = np.empty_like(padded)
+    cell_tiles = [
+        (cy0, min(cy0 + per_tile_y, cells_y), cx0, min(cx0 + per_tile_x, cells_x))
+        for cy0 in range(0, cells_y, per_tile_y)
+        for cx0 in range(0, cells_x, per_tile_x)
+    ]
+    for future in as_completed([executor.pool.submit(process, cells) for cells in cell_tiles]):
+        (cy0, cy1, cx0, cx1), interior = future.result()
+        out[cy0 * cell_h:cy1 * cell_h, cx0 * cell_w:cx1 * cell_w] = interior
+    return out[:h, :w]
@@ -3,11 +3,37 @@ import numpy as np
 from PIL import Image, ImageEnhance, ImageFilter
 import os
 from typing import Tuple, Dict, Any, Optional
+from django.conf import settings
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 import tempfile
+import time
+from functools import lru_cache
+from io import BytesIO
 import json
 from .models import FingerprintImage
+from .cv.denoise import DEFAULT_DENOISE_MODE, DENOISE_BACKENDS, DENOISE_HALOS, denoise
+from .cv.fields import RidgeFields, compute_ridge_fields
+from .cv.gabor import get_gabor_bank
+from .cv.minutiae import extract_minutiae, minutiae_to_dicts
+from .cv.singular import SINGULAR_DTYPE, detect_singular_points, singular_points_to_dicts
+from .cv.pipeline import PipelineRun, StageGraph, get_stage_pool, split_thread_budget
+from .cv.pyramid import DEFAULT_COARSE_SIZE, DEFAULT_TARGET_RIDGE_PERIOD, WorkingImage, build_working_image
+from .cv.quality import QualityMap, block_quality_map, quality_metrics, ridge_clarity
+from .cv.ridge_count import count_core_delta_ridges
+from .cv.segmentation import Segmentation, segment_foreground
+from .cv.thinning import thin
+from .cv.tiling import DEFAULT_TILE_SIZE, get_tile_executor, tiled_clahe
+
+
+class CaptureTooLarge(ValueError):
+    """A capture frame declares more pixels than the capture check accepts"""
+
+
+@lru_cache(maxsize=1)
+def _limit_opencv_threads(budget: int) -> None:
+    """Keep OpenCV's own thread pool within its share of the CV thread budget"""
+    cv2.setNumThreads(budget)
 
 
 class FingerprintImageProcessor:
@@ -16,40 +42,330 @@ class FingerprintImageProcessor:
     enhancement, noise reduction, and ridge detection.
     """
     
-    def __init__(self):
+    # Orientations of the Gabor bank used for ridge pattern analysis; the
+    # bank filters in the frequency domain, so 8 or 16 stay affordable
+    gabor_orientations = 4
+    
+    # Capture checks decode frames at the largest reduction that keeps this
+    # many pixels on the long side, so ridges stay resolved
+    capture_check_size = 1024
+    # ... and grade a window of at most this many working pixels a side
+    # (about 40 ridges) centred on the print
+    capture_check_window = 384
+    # JPEG frames are decoded straight at 1/2, 1/4 or 1/8 scale
+    _reduced_decode_flags = {
+        1: cv2.IMREAD_GRAYSCALE,
+        2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+        4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+        8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+    }
+    
+    # Outputs of preprocess_image and detect_ridges_and_minutiae
+    preprocessing_outputs = ('working', 'segmentation', 'enhanced', 'quality_metrics', 'quality_map')
+    analysis_outputs = ('ridge_patterns', 'minutiae', 'ridge_count', 'ridge_count_segments', 'core_delta')
+    
+    def __init__(self, denoise_mode: Optional[str] = None):
         self.supported_formats = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif', '.webp']
+        self.denoise_mode = denoise_mode or getattr(settings, 'CV_DENOISE_MODE', DEFAULT_DENOISE_MODE)
+        if self.denoise_mode not in DENOISE_BACKENDS:
+            raise ValueError(f"Unknown denoise mode {self.denoise_mode!r}; expected one of {sorted(DENOISE_BACKENDS)}")
+        # Independent stages overlap on a stage pool, and scans larger than a
+        # tile run the heavy stages tile by tile on a tile pool; the pools and
+        # OpenCV's threads nest, so they share one per-process thread budget
+        shares = split_thread_budget(
+            getattr(settings, 'CV_THREAD_BUDGET', 1),
+            getattr(settings, 'CV_PARALLEL_STAGES', False),
+            getattr(settings, 'CV_TILE_WORKERS', 0),
+        )
+        _limit_opencv_threads(shares.opencv)
+        self.tiler = get_tile_executor(getattr(settings, 'CV_TILE_SIZE', DEFAULT_TILE_SIZE), shares.tiles)
+        self.stage_pool = get_stage_pool(shares.stages)
+        # Captures are normalised to this ridge spacing; the coarse pyramid
+        # level that locates the print has at most CV_COARSE_SIZE pixels a side
+        self.target_ridge_period = getattr(settings, 'CV_TARGET_RIDGE_PERIOD', DEFAULT_TARGET_RIDGE_PERIOD)
+        self.coarse_size = getattr(settings, 'CV_COARSE_SIZE', DEFAULT_COARSE_SIZE)
+        # Minutiae are only taken from blocks graded CV_MIN_BLOCK_QUALITY or
+        # better; captures scoring below CV_MIN_QUALITY_SCORE are not analysed
+        self.min_block_quality = getattr(settings, 'CV_MIN_BLOCK_QUALITY', 0)
+        self.min_quality_score = getattr(settings, 'CV_MIN_QUALITY_SCORE', 0)
+        # Capture checks refuse frames whose header declares more pixels than
+        # this, before anything is decoded (0 disables the limit)
+        self.capture_check_max_pixels = getattr(settings, 'CV_CAPTURE_CHECK_MAX_PIXELS', 0)
+        self.graph = self._build_graph()
+    
+    def _build_graph(self) -> StageGraph:
+        """
+        Stage graph of the CV pipeline. Every intermediate is computed once
+        per run and shared by all the stages that consume it.
+        """
+        graph = StageGraph()
+        graph.add('decoded', self._decode_image, 'image_path', 'image_bytes')
+        # The coarse level locates the print and its ridge spacing; everything
+        # after segmentation works on the fingerprint's bounding box at the
+        # working scale
+        graph.add('working', self._working_image, 'decoded')
+        graph.add('segmentation', self._segment_foreground, 'working')
+        graph.add('cropped', self._crop_to_foreground, 'working', 'segmentation')
+        graph.add('normalized', self._normalize_image, 'cropped')
+        graph.add('denoised', self._reduce_noise, 'normalized')
+        graph.add('contrast', self._enhance_contrast, 'denoised')
+        graph.add('enhanced', self._apply_gaussian_filter, 'contrast')
+        graph.add('binary', self._binarize_ridges, 'denoised')
+        graph.add('skeleton', self._thin_ridges, 'binary')
+        graph.add('quality_metrics', self._calculate_quality_metrics, 'cropped', 'enhanced')
+        graph.add('quality_map', self._block_quality_map, 'cropped', 'ridge_fields', 'segmentation')
+        # Cheap grading of the un-denoised crop, as in assess_capture, for
+        # callers that only need the quality gate (see screen_capture)
+        graph.add('screening_fields', self._compute_ridge_fields, 'cropped', 'segmentation')
+        graph.add('screening_map', self._block_quality_map, 'cropped', 'screening_fields', 'segmentation')
+        graph.add('gabor_responses', self._gabor_responses, 'denoised')
+        graph.add('ridge_fields', self._compute_ridge_fields, 'denoised', 'segmentation')
+        graph.add('ridge_patterns', self._detect_ridge_patterns, 'denoised', 'gabor_responses', 'ridge_fields',
+                  'segmentation')
+        graph.add('minutiae', self._minutiae_from_skeleton, 'skeleton', 'segmentation', 'working', 'quality_map')
+        graph.add('singular_points', self._detect_singular_points, 'ridge_fields')
+        graph.add('ridge_count_segments', self._count_core_delta_ridges, 'binary', 'singular_points', 'segmentation',
+                  'working')
+        graph.add('ridge_count', self._ridge_count_from_segments, 'ridge_count_segments')
+        graph.add('core_delta', self._core_delta_from_singular_points, 'singular_points', 'segmentation', 'working')
+        return graph
+    
+    def start(self, image_path: str, image_bytes: Optional[bytes] = None) -> PipelineRun:
+        """
+        Begin a pipeline run for one image. Pass the run to
+        ``preprocess_image`` and ``detect_ridges_and_minutiae`` so they share
+        the decoded, normalized and denoised images; ``run.timings`` holds
+        the per-stage times in milliseconds.
+        """
+        return self.graph.run(image_path=image_path, image_bytes=image_bytes)
+    
+    def compute(self, run: PipelineRun) -> None:
+        """
+        Compute everything ``preprocess_image`` and ``detect_ridges_and_minutiae``
+        return in one pass, so independent stages of both overlap. Captures
+        without a usable print (see ``rejection_reason``) skip the analysis
+        stages.
+        """
+        outputs = self.preprocessing_outputs
+        if self.rejection_reason(run) is None:
+            outputs += self.analysis_outputs
+        run.evaluate(outputs, self.stage_pool)
+    
+    def rejection_reason(self, run: PipelineRun, quality_stage: str = 'quality_map') -> Optional[str]:
+        """Why the capture is not worth analysing, or None when it is"""
+        if not run['working'].foreground:
+            return 'No fingerprint found in the image'
+        run.evaluate((quality_stage,), self.stage_pool)
+        score = run[quality_stage].score
+        if score < self.min_quality_score:
+            return f'Fingerprint quality {score:.0f} is below the minimum of {self.min_quality_score:.0f}'
+        return None
+    
+    def screen_capture(self, run: PipelineRun) -> Dict[str, Any]:
+        """
+        Quality gate for analyses that do not run the CV pipeline, such as
+        the ONNX classifier: the working image, its foreground and the block
+        quality map of the un-denoised crop, as in ``assess_capture``.
+        Returns the rejection reason (None for a usable capture) and the
+        quality map payload (None when no print was found).
+        """
+        reason = self.rejection_reason(run, 'screening_map')
+        quality_map = None
+        if run['working'].foreground:
+            quality_map = self._quality_map_payload(run['screening_map'], run['segmentation'], run['working'])
+        return {'rejection_reason': reason, 'quality_map': quality_map}
+    
+    def assess_capture(self, image_bytes: bytes) -> Dict[str, Any]:
+        """
+        Quick usability check of a raw capture frame for capture loops.
         
-    def preprocess_image(self, image_path: str) -> Dict[str, Any]:
+        The frame is decoded at reduced size, located on the coarse pyramid
+        level, normalised to the target ridge spacing and graded with the
+        block quality map; no denoising, thinning or minutiae. Nothing is
+        stored. Returns the score, whether the capture is worth analysing
+        and guidance for retaking it. Frames over ``capture_check_max_pixels``
+        fail with ``too_large`` set.
         """
-        Complete preprocessing pipeline for fingerprint images
+        started = time.perf_counter()
+        try:
+            frame, reduction = self._decode_reduced(image_bytes, self.capture_check_size,
+                                                    self.capture_check_max_pixels)
+            working = build_working_image(frame, self.target_ridge_period, self.coarse_size)
+            
+            result = {
+                'success': True,
+                'usable': False,
+                'score': 0.0,
+                'guidance': [],
+                'frame_shape': [int(v * reduction) for v in frame.shape],
+                'foreground_bbox': None,
+                'ridge_period': round(working.ridge_period * reduction, 2),
+                'quality_features': {},
+            }
+            if not working.foreground:
+                result['guidance'] = ['No fingerprint detected. Place your finger in the frame.']
+                result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+                return result
+            
+            # The same foreground, fields and quality map as the full pipeline,
+            # on the un-denoised crop
+            segmentation = segment_foreground(working.image)
+            cropped, foreground = self._capture_window(segmentation.crop(working.image), segmentation)
+            quality = block_quality_map(cropped, compute_ridge_fields(cropped), foreground)
+            brightness = cv2.mean(cropped, mask=quality.pixel_mask(1, cropped.shape))[0]
+            
+            result['score'] = round(quality.score, 2)
+            result['usable'] = quality.score >= self.min_quality_score
+            result['foreground_bbox'] = [int(v * reduction) for v in working.frame_bbox(segmentation.bbox)]
+            result['quality_features'] = quality.to_dict()['features']
+            result['guidance'] = self._capture_guidance(quality, working, segmentation, brightness)
+            result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+            return result
+            
+        except CaptureTooLarge as e:
+            return {
+                'success': False,
+                'too_large': True,
+                'error': str(e),
+                'usable': False,
+                'score': 0.0,
+                'guidance': ['The frame is too large. Send a preview-sized frame.'],
+                'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'usable': False,
+                'score': 0.0,
+                'guidance': ['The image could not be read. Capture it again.'],
+                'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)
+            }
+    
+    def _capture_window(self, cropped: np.ndarray, segmentation: Segmentation) -> Tuple[np.ndarray, np.ndarray]:
+        """Block-aligned window of the crop centred on the print, and its foreground blocks"""
+        foreground = segmentation.block_mask()
+        b = segmentation.block_size
+        side = self.capture_check_window // b
+        rows, cols = np.nonzero(foreground)
+        if rows.size == 0:
+            return cropped, foreground
+        r0 = min(max(0, int(rows.mean()) - side // 2), max(0, foreground.shape[0] - side))
+        c0 = min(max(0, int(cols.mean()) - side // 2), max(0, foreground.shape[1] - side))
+        return cropped[r0 * b:(r0 + side) * b, c0 * b:(c0 + side) * b], foreground[r0:r0 + side, c0:c0 + side]
+    
+    def _decode_reduced(self, image_bytes: bytes, min_side: int, max_pixels: int = 0) -> Tuple[np.ndarray, int]:
         """
+        Grayscale frame decoded at 1/1, 1/2, 1/4 or 1/8 scale, keeping *min_side*
+        pixels on the long side. Only JPEG decodes at reduced scale; other
+        formats are decoded in full and then reduced. Frames that would decode
+        to more than *max_pixels* pixels are refused before decoding.
+        """
+        # The header gives the size without decoding the pixels
         try:
-            # Load image
+            header = Image.open(BytesIO(image_bytes))
+        except Image.DecompressionBombError:
+            raise CaptureTooLarge("Image dimensions are too large") from None
+        except OSError:
+            raise ValueError("Unsupported or corrupt image") from None
+        width, height = header.size
+        reduction = 1
+        while max(width, height) >= min_side * reduction * 2 and reduction < 8:
+            reduction *= 2
+        step = reduction if header.format == 'JPEG' else 1
+        if max_pixels and -(-width // step) * -(-height // step) > max_pixels:
+            raise CaptureTooLarge(f"{width}x{height} frames exceed the limit of {max_pixels / 1e6:g} megapixels")
+        img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), self._reduced_decode_flags[reduction])
+        if img is None:
+            raise ValueError("Unable to decode image")
+        return img, reduction
+    
+    def _capture_guidance(self, quality: QualityMap, working: WorkingImage, segmentation: Segmentation,
+                          brightness: float) -> list:
+        """Retake hints for the weakest aspects of a capture, or a go-ahead"""
+        features = quality.features or {}
+        guidance = []
+        if brightness < 50:
+            guidance.append('Image too dark. Add light or press the finger less firmly.')
+        elif brightness > 205:
+            guidance.append('Image too bright. Reduce the light or press the finger more firmly.')
+        # Fewer than about 16 ridges across the foreground at the target spacing
+        foreground_area = quality.foreground_blocks * segmentation.block_size ** 2
+        if foreground_area < (16 * self.target_ridge_period) ** 2:
+            guidance.append('Fingerprint too small. Move the finger closer or fill more of the frame.')
+        if working.ridge_period == 0 or features.get('ridge_valley_clarity', 0) < 0.35:
+            guidance.append('Ridges are not sharp. Hold still and let the camera focus.')
+        if features.get('orientation_certainty', 0) < 0.5:
+            guidance.append('Ridge flow is unclear. Clean the finger and the sensor and press evenly.')
+        if quality.score < self.min_quality_score and not guidance:
+            guidance.append('Capture quality too low. Please retake it.')
+        return guidance or ['Good capture.']
+    
+    def _decode_image(self, image_path: str, image_bytes: Optional[bytes]) -> np.ndarray:
+        """Decode the image as grayscale, from memory when the bytes are at hand"""
+        if image_bytes is not None:
+            img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_GRAYSCALE)
+        else:
             img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-            if img is None:
-                raise ValueError("Unable to load image")
+        if img is None:
+            raise ValueError("Unable to load image")
+        return img
+    
+    def _working_image(self, img: np.ndarray) -> WorkingImage:
+        """Foreground region of the capture resampled to the target ridge spacing"""
+        return build_working_image(img, self.target_ridge_period, self.coarse_size)
+    
+    def _segment_foreground(self, working: WorkingImage) -> Segmentation:
+        """Foreground blocks of the working image"""
+        return segment_foreground(working.image)
+    
+    def _crop_to_foreground(self, working: WorkingImage, segmentation: Segmentation) -> np.ndarray:
+        """Bounding box of the fingerprint; stages after it skip the background"""
+        return segmentation.crop(working.image)
+    
+    def _uncrop(self, img: np.ndarray, segmentation: Segmentation, working: WorkingImage,
+                shape: tuple) -> np.ndarray:
+        """Place a processed crop back in a full-frame image with a white background"""
+        region = np.full(working.image.shape, 255, dtype=img.dtype)
+        y0, y1, x0, x1 = segmentation.bbox
+        region[y0:y1, x0:x1] = img
+        return working.place(region, shape)
+        
+    def preprocess_image(self, image_path: str, run: Optional[PipelineRun] = None) -> Dict[str, Any]:
+        """
+        Complete preprocessing pipeline for fingerprint images
+        """
+        try:
+            run = run or self.start(image_path)
             
-            # Store original for comparison
+            run.evaluate(self.preprocessing_outputs, self.stage_pool)
+            
+            # Load image and store original for comparison
+            img = run['decoded']
             original_shape = img.shape
             
-            # Apply preprocessing steps
-            processed_img = self._normalize_image(img)
-            processed_img = self._reduce_noise(processed_img)
-            processed_img = self._enhance_contrast(processed_img)
-            processed_img = self._apply_gaussian_filter(processed_img)
+            # Normalization, noise reduction, contrast enhancement, gaussian
+            # filtering of the fingerprint region, placed back in the frame
+            working = run['working']
+            processed_img = self._uncrop(run['enhanced'], run['segmentation'], working, original_shape)
             
             # Generate enhanced image path
             enhanced_path = self._save_enhanced_image(processed_img, image_path)
             
             # Calculate quality metrics
-            quality_metrics = self._calculate_quality_metrics(img, processed_img)
+            quality_metrics = run['quality_metrics']
             
             return {
                 'success': True,
                 'enhanced_image_path': enhanced_path,
                 'original_shape': original_shape,
                 'processed_shape': processed_img.shape,
+                'foreground_bbox': [int(v) for v in working.frame_bbox(run['segmentation'].bbox)],
+                'working_scale': round(working.scale, 3),
+                'ridge_period': round(working.ridge_period, 2),
                 'quality_metrics': quality_metrics,
+                'quality_map': self._quality_map_payload(run['quality_map'], run['segmentation'], working),
+                'stage_timings': dict(run.timings),
                 'preprocessing_steps': [
                     'normalization',
                     'noise_reduction', 
@@ -77,19 +393,15 @@ class FingerprintImageProcessor:
     
     def _reduce_noise(self, img: np.ndarray) -> np.ndarray:
         """Remove noise from fingerprint image"""
-        # Apply median filter to remove salt-and-pepper noise
-        denoised = cv2.medianBlur(img, 3)
-        
-        # Apply bilateral filter to reduce noise while preserving edges
-        denoised = cv2.bilateralFilter(denoised, 9, 75, 75)
-        
-        return denoised
+        # Median filter for salt-and-pepper noise, then the configured
+        # edge-preserving smoother (bilateral, guided or fast_guided)
+        halo, align = DENOISE_HALOS[self.denoise_mode]
+        return self.tiler.map(lambda tile: denoise(tile, self.denoise_mode), img, halo, align)
     
     def _enhance_contrast(self, img: np.ndarray) -> np.ndarray:
         """Enhance contrast for better ridge visibility"""
         # Apply CLAHE (Contrast Limited Adaptive Histogram Equalization)
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        enhanced = clahe.apply(img)
+        enhanced = tiled_clahe(self.tiler, img, clip_limit=2.0, grid=(8, 8))
         
         return enhanced
     
@@ -130,20 +442,15 @@ class FingerprintImageProcessor:
     def _calculate_quality_metrics(self, original: np.ndarray, processed: np.ndarray) -> Dict[str, float]:
         """Calculate image quality metrics"""
         try:
-            # Calculate sharpness using Laplacian variance
-            sharpness = cv2.Laplacian(processed, cv2.CV_64F).var()
-            
-            # Calculate contrast
-            contrast = processed.std()
-            
-            # Calculate brightness
-            brightness = processed.mean()
-            
-            # Calculate noise level (difference between original and processed)
-            noise_level = np.mean(np.abs(original.astype(float) - processed.astype(float)))
-            
-            # Calculate ridge clarity (using local binary patterns)
-            ridge_clarity = self._calculate_ridge_clarity(processed)
+            # Laplacian variance (sharpness), intensity spread and mean,
+            # difference from the original and ridge clarity in one float32
+            # pass that reuses its gradient buffers
+            metrics = quality_metrics(original, processed)
+            sharpness = metrics['sharpness']
+            contrast = metrics['contrast']
+            brightness = metrics['brightness']
+            noise_level = metrics['noise_level']
+            ridge_clarity = metrics['ridge_clarity']
             
             # Overall quality score (0-100)
             quality_score = min(100, max(0, (sharpness / 1000) * 30 + (contrast / 100) * 25 + 
@@ -169,60 +476,84 @@ class FingerprintImageProcessor:
                 'overall_quality': 0.0
             }
     
+    def _block_quality_map(self, img: np.ndarray, fields: RidgeFields,
+                           segmentation: Optional[Segmentation] = None) -> QualityMap:
+        """NFIQ-style quality of every ridge-field block, 0 on the background"""
+        foreground = segmentation.block_mask() if segmentation is not None else None
+        return block_quality_map(img, fields, foreground)
+    
+    def _quality_map_payload(self, quality: QualityMap, segmentation: Segmentation,
+                             working: WorkingImage) -> Dict[str, Any]:
+        """Compact quality grid with where its blocks fall in the original image"""
+        payload = quality.to_dict()
+        x, y = working.frame_xy(0, 0, segmentation.offset)
+        payload['origin'] = [int(x), int(y)]
+        payload['frame_block_size'] = round(quality.block_size / working.scale, 2)
+        return payload
+    
     def _calculate_ridge_clarity(self, img: np.ndarray) -> float:
         """Calculate ridge clarity using local binary patterns"""
         try:
-            # Apply Sobel operator to detect edges (ridges)
-            sobel_x = cv2.Sobel(img, cv2.CV_64F, 1, 0, ksize=3)
-            sobel_y = cv2.Sobel(img, cv2.CV_64F, 0, 1, ksize=3)
-            
-            # Calculate gradient magnitude
-            gradient_magnitude = np.sqrt(sobel_x**2 + sobel_y**2)
-            
-            # Calculate ridge clarity as percentage of strong gradients
-            strong_gradients = np.sum(gradient_magnitude > np.percentile(gradient_magnitude, 75))
-            total_pixels = gradient_magnitude.size
-            
-            clarity = (strong_gradients / total_pixels) * 100
-            
-            return min(100, clarity)
+            # Percentage of pixels whose Sobel gradient magnitude is above the
+            # 75th percentile, taken from a histogram rather than a sort
+            return ridge_clarity(img)
             
         except Exception as e:
             print(f"Error calculating ridge clarity: {str(e)}")
             return 0.0
     
-    def detect_ridges_and_minutiae(self, image_path: str) -> Dict[str, Any]:
+    def detect_ridges_and_minutiae(self, image_path: str, run: Optional[PipelineRun] = None) -> Dict[str, Any]:
         """
         Advanced ridge detection and minutiae extraction
         """
         try:
-            img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-            if img is None:
-                raise ValueError("Unable to load image")
-            
-            # Preprocess for ridge detection
-            processed = self._normalize_image(img)
-            processed = self._reduce_noise(processed)
+            # Normalized and denoised image is shared with preprocess_image;
+            # the independent stages below run concurrently when enabled
+            run = run or self.start(image_path)
+            rejection_reason = self.rejection_reason(run)
+            if rejection_reason is not None:
+                # Early exit: no print, or one too poor to analyse
+                return {
+                    'success': True,
+                    'ridge_count': 0,
+                    'ridge_count_segments': [],
+                    'minutiae_points': [],
+                    'core_points': [],
+                    'delta_points': [],
+                    'ridge_pattern_analysis': {
+                        'dominant_orientation': 0,
+                        'ridge_orientation': 0,
+                        'orientation_coherence': 0,
+                        'ridge_frequency': 0,
+                        'pattern_strength': 0
+                    },
+                    'stage_timings': dict(run.timings),
+                    'early_exit': True,
+                    'rejection_reason': rejection_reason
+                }
+            run.evaluate(self.analysis_outputs, self.stage_pool)
             
             # Ridge detection using oriented filters
-            ridges = self._detect_ridge_patterns(processed)
+            ridges = run['ridge_patterns']
             
             # Minutiae detection
-            minutiae = self._detect_minutiae_points(processed)
+            minutiae = run['minutiae']
             
             # Ridge counting
-            ridge_count = self._count_ridges(processed)
+            ridge_count = run['ridge_count']
             
             # Core and delta detection
-            core_points, delta_points = self._detect_core_delta_points(processed)
+            core_points, delta_points = run['core_delta']
             
             return {
                 'success': True,
                 'ridge_count': ridge_count,
+                'ridge_count_segments': run['ridge_count_segments'],
                 'minutiae_points': minutiae,
                 'core_points': core_points,
                 'delta_points': delta_points,
-                'ridge_pattern_analysis': ridges
+                'ridge_pattern_analysis': ridges,
+                'stage_timings': dict(run.timings)
             }
             
         except Exception as e:
@@ -235,30 +566,49 @@ class FingerprintImageProcessor:
                 'delta_points': []
             }
     
-    def _detect_ridge_patterns(self, img: np.ndarray) -> Dict[str, Any]:
-        """Detect ridge patterns using Gabor filters"""
+    def _gabor_responses(self, img: np.ndarray) -> np.ndarray:
+        """Float32 stack of Gabor responses, one slice per bank orientation"""
+        bank = get_gabor_bank(self.gabor_orientations)
+        return self.tiler.map(bank.apply, img, halo=bank.ksize // 2)
+    
+    def _compute_ridge_fields(self, img: np.ndarray, segmentation: Optional[Segmentation] = None) -> RidgeFields:
+        """Block orientation and frequency fields; background blocks get no coherence or frequency"""
+        fields = compute_ridge_fields(img)
+        if segmentation is None:
+            return fields
+        foreground = segmentation.block_mask()
+        return fields._replace(coherence=np.where(foreground, fields.coherence, 0).astype(np.float32),
+                               frequency=np.where(foreground, fields.frequency, 0).astype(np.float32))
+    
+    def _detect_ridge_patterns(self, img: np.ndarray, responses: Optional[np.ndarray] = None,
+                               fields: Optional[RidgeFields] = None,
+                               segmentation: Optional[Segmentation] = None) -> Dict[str, Any]:
+        """Detect ridge patterns using Gabor filters and the block orientation field"""
         try:
-            # Apply Gabor filters at different orientations
-            orientations = [0, 45, 90, 135]
-            responses = []
-            
-            for angle in orientations:
-                # Create Gabor kernel
-                kernel = cv2.getGaborKernel((21, 21), 5, np.radians(angle), 2*np.pi*0.1, 0.5, 0, ktype=cv2.CV_32F)
-                
-                # Apply filter
-                response = cv2.filter2D(img, cv2.CV_8UC3, kernel)
-                responses.append(response)
+            bank = get_gabor_bank(self.gabor_orientations)
+            if responses is None:
+                responses = bank.apply(img)
+            if fields is None:
+                fields = self._compute_ridge_fields(img, segmentation)
+            
+            # Statistics are taken over 8-bit responses, as the spatial filter
+            # produced, of the foreground pixels only
+            clipped = np.clip(responses, 0, 255)
+            if segmentation is not None:
+                clipped = clipped[:, segmentation.pixel_mask() > 0]
+            foreground = segmentation.block_mask() if segmentation is not None else np.ones(fields.shape, bool)
             
             # Combine responses
-            combined_response = np.mean(responses, axis=0)
+            combined_response = clipped.mean(axis=0)
             
             # Analyze dominant orientation
-            dominant_orientation = self._calculate_dominant_orientation(responses, orientations)
+            dominant_orientation = self._calculate_dominant_orientation(clipped, bank.angles.tolist())
             
             return {
                 'dominant_orientation': dominant_orientation,
-                'ridge_frequency': self._estimate_ridge_frequency(img),
+                'ridge_orientation': round(fields.dominant_orientation(), 1) % 180.0,
+                'orientation_coherence': round(float(fields.coherence[foreground].mean()), 3) if foreground.any() else 0.0,
+                'ridge_frequency': round(fields.median_frequency(), 4),
                 'pattern_strength': float(np.std(combined_response))
             }
             
@@ -266,146 +616,131 @@ class FingerprintImageProcessor:
             print(f"Error in ridge pattern detection: {str(e)}")
             return {
                 'dominant_orientation': 0,
+                'ridge_orientation': 0,
+                'orientation_coherence': 0,
                 'ridge_frequency': 0,
                 'pattern_strength': 0
             }
     
     def _detect_minutiae_points(self, img: np.ndarray) -> list:
         """Detect minutiae points (ridge endings and bifurcations)"""
+        return self._minutiae_from_skeleton(self._extract_skeleton(img))
+    
+    def _minutiae_from_skeleton(self, skeleton: np.ndarray, segmentation: Optional[Segmentation] = None,
+                                working: Optional[WorkingImage] = None,
+                                quality: Optional[QualityMap] = None) -> list:
+        """Minutiae of an already thinned ridge skeleton"""
         try:
-            # Apply thinning to get skeleton
-            kernel = np.ones((3, 3), np.uint8)
-            thinned = cv2.morphologyEx(img, cv2.MORPH_CLOSE, kernel)
-            
-            # Apply threshold
-            _, binary = cv2.threshold(thinned, 127, 255, cv2.THRESH_BINARY)
-            
-            # Skeleton extraction
-            skeleton = cv2.ximgproc.thinning(binary)
-            
-            # Find minutiae points
-            minutiae = []
-            height, width = skeleton.shape
-            
-            for i in range(1, height-1):
-                for j in range(1, width-1):
-                    if skeleton[i, j] == 255:  # White pixel (ridge)
-                        # Count neighbors
-                        neighbors = [
-                            skeleton[i-1, j-1], skeleton[i-1, j], skeleton[i-1, j+1],
-                            skeleton[i, j-1],                     skeleton[i, j+1],
-                            skeleton[i+1, j-1], skeleton[i+1, j], skeleton[i+1, j+1]
-                        ]
-                        
-                        neighbor_count = sum(1 for n in neighbors if n == 255)
-                        
-                        # Minutiae detection
-                        if neighbor_count == 1:  # Ridge ending
-                            minutiae.append({'type': 'ending', 'x': int(j), 'y': int(i)})
-                        elif neighbor_count >= 3:  # Bifurcation
-                            minutiae.append({'type': 'bifurcation', 'x': int(j), 'y': int(i)})
-            
-            return minutiae[:50]  # Limit to top 50 minutiae points
+            # Crossing numbers for the whole skeleton at once, spurious
+            # minutiae filtered with array operations; nothing near or
+            # outside the edge of the foreground counts
+            mask = segmentation.pixel_mask() if segmentation is not None else None
+            if quality is not None and self.min_block_quality > 0:
+                # Low-quality blocks are left out like the background
+                mask = quality.pixel_mask(self.min_block_quality, skeleton.shape)
+            minutiae = extract_minutiae(skeleton, mask=mask)
+            
+            return minutiae_to_dicts(self._to_frame(minutiae, segmentation, working))
             
         except Exception as e:
             print(f"Error in minutiae detection: {str(e)}")
             return []
     
+    def _extract_skeleton(self, img: np.ndarray) -> np.ndarray:
+        """Binarize the ridges and thin them to a one-pixel-wide skeleton"""
+        return self._thin_ridges(self._binarize_ridges(img))
+    
+    def _binarize_ridges(self, img: np.ndarray) -> np.ndarray:
+        """Binary ridge image (255 = ridge) shared by thinning and ridge counting"""
+        # Close small gaps in the ridges
+        kernel = np.ones((3, 3), np.uint8)
+        closed = cv2.morphologyEx(img, cv2.MORPH_CLOSE, kernel)
+        
+        # Apply threshold
+        _, binary = cv2.threshold(closed, 127, 255, cv2.THRESH_BINARY)
+        
+        return binary
+    
+    def _thin_ridges(self, binary: np.ndarray) -> np.ndarray:
+        """Thin binary ridges to a one-pixel-wide skeleton"""
+        # opencv-contrib's thinning when installed, the NumPy Zhang-Suen
+        # otherwise; on the whole image, since thinning is not local enough
+        # to tile seamlessly
+        return thin(binary)
+    
     def _count_ridges(self, img: np.ndarray) -> int:
         """Count ridges between core and delta points"""
+        points = self._detect_singular_points(compute_ridge_fields(img))
+        return self._ridge_count_from_segments(self._count_core_delta_ridges(self._binarize_ridges(img), points))
+    
+    def _count_core_delta_ridges(self, binary: np.ndarray, points: np.ndarray,
+                                 segmentation: Optional[Segmentation] = None,
+                                 working: Optional[WorkingImage] = None) -> list:
+        """Ridges crossed on every core-to-delta segment"""
         try:
-            # Apply edge detection
-            edges = cv2.Canny(img, 50, 150)
-            
-            # Find contours
-            contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            # Filter contours by area and shape
-            ridge_contours = []
-            for contour in contours:
-                area = cv2.contourArea(contour)
-                if 50 < area < 1000:  # Filter by reasonable ridge area
-                    ridge_contours.append(contour)
-            
-            return len(ridge_contours)
+            # Samples along the segments only, not the whole image
+            offset = segmentation.offset if segmentation is not None else (0, 0)
+            if working is None:
+                return count_core_delta_ridges(binary, points, offset=offset)
+            segments = count_core_delta_ridges(binary, points)
+            for segment in segments:
+                for end in (segment['core'], segment['delta']):
+                    x, y = working.frame_xy(end['x'], end['y'], offset)
+                    end['x'], end['y'] = int(x), int(y)
+            return segments
             
         except Exception as e:
             print(f"Error in ridge counting: {str(e)}")
-            return 0
+            return []
+    
+    def _ridge_count_from_segments(self, segments: list) -> int:
+        """Ridge count between the most confident core and delta (0 without both)"""
+        return segments[0]['ridge_count'] if segments else 0
     
     def _detect_core_delta_points(self, img: np.ndarray) -> Tuple[list, list]:
         """Detect core and delta points in fingerprint"""
+        return self._core_delta_from_singular_points(self._detect_singular_points(compute_ridge_fields(img)))
+    
+    def _detect_singular_points(self, fields: RidgeFields) -> np.ndarray:
+        """Cores and deltas from the Poincaré index of the block orientation field"""
         try:
-            # Apply Harris corner detection
-            corners = cv2.cornerHarris(img, 2, 3, 0.04)
-            
-            # Threshold for corner detection
-            corners = cv2.dilate(corners, None)
-            
-            # Find coordinates of corners
-            corner_coords = np.where(corners > 0.01 * corners.max())
-            
-            # Analyze corner patterns for core/delta classification
-            core_points = []
-            delta_points = []
-            
-            for i in range(min(10, len(corner_coords[0]))):  # Limit to top 10 points
-                y, x = corner_coords[0][i], corner_coords[1][i]
-                
-                # Simple heuristic: points in center area more likely to be core
-                height, width = img.shape
-                if width * 0.3 < x < width * 0.7 and height * 0.3 < y < height * 0.7:
-                    core_points.append({'x': int(x), 'y': int(y)})
-                else:
-                    delta_points.append({'x': int(x), 'y': int(y)})
-            
-            return core_points[:3], delta_points[:3]  # Limit to 3 each
+            return detect_singular_points(fields)
             
         except Exception as e:
             print(f"Error in core/delta detection: {str(e)}")
-            return [], []
+            return np.empty(0, dtype=SINGULAR_DTYPE)
     
-    def _calculate_dominant_orientation(self, responses: list, orientations: list) -> float:
+    def _core_delta_from_singular_points(self, points: np.ndarray,
+                                         segmentation: Optional[Segmentation] = None,
+                                         working: Optional[WorkingImage] = None) -> Tuple[list, list]:
+        """Core and delta payloads, up to 2 of each, most confident first"""
+        return singular_points_to_dicts(self._to_frame(points, segmentation, working))
+    
+    def _to_frame(self, points: np.ndarray, segmentation: Optional[Segmentation],
+                  working: Optional[WorkingImage] = None) -> np.ndarray:
+        """Copy of structured *points* with x/y moved from crop to image coordinates"""
+        offset = segmentation.offset if segmentation is not None else (0, 0)
+        if working is not None:
+            return working.to_frame(points, offset)
+        if offset == (0, 0):
+            return points
+        shifted = points.copy()
+        shifted['x'] += offset[0]
+        shifted['y'] += offset[1]
+        return shifted
+    
+    def _calculate_dominant_orientation(self, responses: np.ndarray, orientations: list) -> float:
         """Calculate dominant ridge orientation"""
         try:
-            max_response = 0
-            dominant_angle = 0
-            
-            for i, response in enumerate(responses):
-                response_strength = np.mean(response)
-                if response_strength > max_response:
-                    max_response = response_strength
-                    dominant_angle = orientations[i]
+            strengths = np.asarray(responses, dtype=np.float32).reshape(len(orientations), -1).mean(axis=1)
+            if not np.any(strengths > 0):
+                return 0.0
             
-            return float(dominant_angle)
+            return float(orientations[int(np.argmax(strengths))])
             
         except Exception as e:
             print(f"Error calculating dominant orientation: {str(e)}")
             return 0.0
-    
-    def _estimate_ridge_frequency(self, img: np.ndarray) -> float:
-        """Estimate ridge frequency in the fingerprint"""
-        try:
-            # Apply FFT to estimate frequency
-            f_transform = np.fft.fft2(img)
-            f_shift = np.fft.fftshift(f_transform)
-            
-            # Calculate magnitude spectrum
-            magnitude_spectrum = np.log(np.abs(f_shift) + 1)
-            
-            # Find dominant frequency
-            height, width = magnitude_spectrum.shape
-            center_y, center_x = height // 2, width // 2
-            
-            # Calculate average frequency in a region around center
-            region = magnitude_spectrum[center_y-20:center_y+20, center_x-20:center_x+20]
-            avg_frequency = np.mean(region)
-            
-            return float(avg_frequency)
-            
-        except Exception as e:
-            print(f"Error estimating ridge frequency: {str(e)}")
-            return 0.0
 
 
 class FingerprintMerger:
@@ -530,9 +865,10 @@ class FingerprintMerger:
         try:
             # Calculate seamlessness (edge continuity)
             edges = cv2.Canny(merged_img, 50, 150)
-            edge_density = np.sum(edges > 0) / edges.size
+            edge_density = cv2.countNonZero(edges) / edges.size
             
-            # Calculate overall quality metrics
+            # Calculate overall quality metrics; the merged image is its own
+            # reference, so the engine skips the noise comparison
             quality_metrics = self.processor._calculate_quality_metrics(merged_img, merged_img)
             
             # Add merge-specific metrics
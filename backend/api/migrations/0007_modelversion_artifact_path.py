@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-17 16:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_alter_mergedfingerprint_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='modelversion',
+            name='artifact_path',
+            field=models.CharField(blank=True, default='', help_text='ONNX file served by the model registry (relative to BASE_DIR); blank for the CV pipeline', max_length=255),
+        ),
+    ]
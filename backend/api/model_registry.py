@@ -0,0 +1,296 @@
+"""
+Registry of loaded fingerprint ML models, tied to ``ModelVersion`` rows.
+
+The registry owns the ONNX classifier(s) the analysis views use.  A model is
+only published after warm-up inferences have run, and switching to another
+``ModelVersion`` is a single reference swap, so in-flight requests finish on
+the old model while new ones use the new one.  Workers poll the database at
+most every ``ML_REGISTRY_REFRESH_SECONDS`` for a change of active version,
+which lets an admin roll out a model without restarting workers.
+
+``ModelVersion`` rows are cached per process, so recording an analysis does
+not need a ``get_or_create`` round trip.
+
+Importing this module is cheap: onnxruntime (and, only when a ``.pth``
+checkpoint has to be exported, torch) are imported when the first model is
+loaded, not when Django loads the URLconf.
+"""
+import json
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import ModelVersion
+
+ONNX_MODEL_PATH = Path(settings.BASE_DIR) / "mobilenet_v2_best.onnx"
+PTH_MODEL_PATH = Path(settings.BASE_DIR) / "mobilenet_v2_best.pth"
+
+DEFAULT_ONNX_VERSION = "MobileNetMultiTask (ONNX)"
+ONNX_FRAMEWORK = "ONNX Runtime"
+
+
+class LoadedModel:
+    """A warmed-up classifier together with the ``ModelVersion`` it serves."""
+
+    def __init__(self, version, classifier, batcher=None):
+        self.version = version
+        self.classifier = classifier
+        self.batcher = batcher
+        self.loaded_at = timezone.now()
+
+    def analyse(self, image_path, top_k=0):
+        runner = self.batcher or self.classifier
+        return runner.analyse(image_path, top_k=top_k)
+
+    def close(self):
+        if self.batcher:
+            self.batcher.close()
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of fingerprint models.
+    """
+
+    def __init__(self):
+        self._active = None
+        self._started = False
+        self._swap_lock = threading.RLock()
+        self._version_lock = threading.Lock()
+        self._versions = {}
+        self._last_refresh = 0.0
+        self._refreshing = False
+        self._swaps = 0
+        self._listeners = []
+
+    # ------------------------------------------------------------------
+    # Serving
+    # ------------------------------------------------------------------
+
+    def active(self):
+        """Return the active ``LoadedModel`` or ``None`` (CV fallback)."""
+        if not self._started:
+            self.start()
+        elif time.monotonic() - self._last_refresh >= self.refresh_seconds:
+            self._refresh_in_background()
+        return self._active
+
+    def start(self):
+        """Load and warm up the active model (idempotent)."""
+        with self._swap_lock:
+            if self._started:
+                return
+            try:
+                version = self._resolve_active_version()
+                if version is not None:
+                    self.activate(version)
+                else:
+                    print("[ML] No fingerprint ML model found – falling back to CV pipeline")
+            except Exception as e:
+                # e.g. the database is unreachable or not migrated yet;
+                # refresh() retries until a model is active
+                print(f"[ML] Failed to load ONNX model: {e}")
+            self._last_refresh = time.monotonic()
+            self._started = True
+
+    def activate(self, version):
+        """Load and warm up *version*, then atomically make it the active model."""
+        with self._swap_lock:
+            if self._active is not None and self._active.version.pk == version.pk:
+                return self._active
+            loaded = self._load(version)
+            previous, self._active = self._active, loaded
+            self._remember_version(version)
+            self._swaps += 1
+            if previous is not None:
+                previous.close()
+            print(f"[ML] Serving {version.version_number} from {version.artifact_path}")
+            for listener in list(self._listeners):
+                try:
+                    listener(loaded)
+                except Exception as e:
+                    print(f"[ML] Model swap listener failed: {e}")
+            return loaded
+
+    def add_listener(self, callback):
+        """Call ``callback(loaded_model)`` every time a new model is activated."""
+        self._listeners.append(callback)
+
+    def refresh(self):
+        """Switch to the database's active version if it has changed."""
+        self._last_refresh = time.monotonic()
+        if self._active is None:
+            # Nothing served yet (no model, or start() failed): register the
+            # bundled model if the database has no active row
+            version = self._resolve_active_version()
+        else:
+            version = self._active_version_row()
+        if version is not None and (self._active is None or self._active.version.pk != version.pk):
+            self.activate(version)
+
+    @property
+    def refresh_seconds(self):
+        return getattr(settings, "ML_REGISTRY_REFRESH_SECONDS", 30)
+
+    # ------------------------------------------------------------------
+    # ModelVersion cache
+    # ------------------------------------------------------------------
+
+    def model_version(self, version_number, defaults):
+        """Cached ``ModelVersion.objects.get_or_create`` for *version_number*."""
+        version = self._versions.get(version_number)
+        if version is None:
+            version, _ = ModelVersion.objects.get_or_create(version_number=version_number, defaults=defaults)
+            self._remember_version(version)
+        return version
+
+    def _remember_version(self, version):
+        with self._version_lock:
+            self._versions[version.version_number] = version
+
+    # ------------------------------------------------------------------
+    # Introspection
+    # ------------------------------------------------------------------
+
+    def stats(self):
+        active = self._active
+        return {
+            'model_loaded': active is not None,
+            'active_version': active.version.version_number if active else None,
+            'active_version_id': active.version.pk if active else None,
+            'loaded_at': active.loaded_at.isoformat() if active else None,
+            'swaps': self._swaps,
+            'micro_batching': active.batcher.stats() if active and active.batcher else None,
+        }
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _load(self, version):
+        from backend.ml import FingerClassifier, MicroBatcher  # type: ignore
+
+        path = Path(version.artifact_path)
+        if not path.is_absolute():
+            path = Path(settings.BASE_DIR) / path
+        classifier = FingerClassifier(
+            path,
+            max_batch_size=getattr(settings, "ML_MAX_BATCH_SIZE", 32),
+            profile=getattr(settings, "ML_SESSION_PROFILE", "throughput"),
+            session_options=getattr(settings, "ML_SESSION_OPTIONS", None),
+            cache_optimized=getattr(settings, "ML_CACHE_OPTIMIZED_MODEL", False),
+            io_binding=getattr(settings, "ML_IO_BINDING", False),
+        )
+
+        batcher = None
+        if getattr(settings, "ML_MICRO_BATCHING", True):
+            batcher = MicroBatcher(
+                classifier,
+                max_batch_size=getattr(settings, "ML_BATCH_MAX_SIZE", 8),
+                max_wait_ms=getattr(settings, "ML_BATCH_MAX_WAIT_MS", 5.0),
+            )
+
+        # Run the smallest and largest batch the scheduler will send so the
+        # session's allocator arenas are sized before the first request.
+        sizes = {1, batcher.max_batch_size if batcher else 1}
+        for _ in range(getattr(settings, "ML_WARMUP_RUNS", 2)):
+            for size in sizes:
+                classifier.analyse_preprocessed(_warmup_input(classifier, size))
+        return LoadedModel(version, classifier, batcher)
+
+    def _active_version_row(self):
+        return (
+            ModelVersion.objects.filter(is_active=True)
+            .exclude(artifact_path='')
+            .order_by('-release_date', '-pk')
+            .first()
+        )
+
+    def _resolve_active_version(self):
+        """Return the active registry row, registering the bundled model if none."""
+        version = self._active_version_row()
+        if version is not None:
+            return version
+
+        path = self._default_artifact()
+        if path is None:
+            return None
+        variant = getattr(settings, "ML_MODEL_VARIANT", "fp32")
+        try:
+            artifact = str(path.relative_to(settings.BASE_DIR))
+        except ValueError:
+            artifact = str(path)
+        with transaction.atomic():
+            version, created = ModelVersion.objects.get_or_create(
+                version_number=DEFAULT_ONNX_VERSION,
+                defaults={
+                    "release_date": timezone.now(),
+                    "accuracy_score": 0.0,
+                    "training_dataset": "Fingerprint pattern dataset",
+                    "model_parameters": json.dumps({"type": DEFAULT_ONNX_VERSION, "variant": variant}),
+                    "is_active": True,
+                    "framework_used": ONNX_FRAMEWORK,
+                    "artifact_path": artifact,
+                },
+            )
+            if not created and (version.artifact_path != artifact or not version.is_active):
+                # Row predates the registry (created by the analysis view)
+                version.artifact_path = artifact
+                version.framework_used = ONNX_FRAMEWORK
+                version.is_active = True
+                version.save(update_fields=["artifact_path", "framework_used", "is_active"])
+        return version
+
+    def _default_artifact(self):
+        """The bundled model file, exporting the ``.pth`` checkpoint if needed."""
+        from backend.ml import variant_path  # type: ignore
+
+        # Serve a quantised artifact (see backend/ml/quantize.py) when configured
+        variant = getattr(settings, "ML_MODEL_VARIANT", "fp32")
+        model_path = variant_path(ONNX_MODEL_PATH, variant)
+        if variant != "fp32" and not model_path.exists():
+            print(f"[ML] {variant} model not found at {model_path} – using FP32 model")
+            model_path = ONNX_MODEL_PATH
+
+        if model_path.exists():
+            return model_path
+        if PTH_MODEL_PATH.exists():
+            # Export path only: this is the one place torch gets imported
+            from backend.ml import load_checkpoint, save_onnx  # type: ignore
+
+            print("[ML] ONNX model not found but .pth checkpoint present – exporting to ONNX…")
+            model = load_checkpoint(PTH_MODEL_PATH, num_classes=None, device="cpu")
+            save_onnx(model, ONNX_MODEL_PATH, raw_input=getattr(settings, "ML_EXPORT_RAW_INPUT", True))
+            return ONNX_MODEL_PATH
+        return None
+
+    def _refresh_in_background(self):
+        with self._version_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            self._last_refresh = time.monotonic()
+        threading.Thread(target=self._background_refresh, name="model-registry-refresh", daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"[ML] Model registry refresh failed: {e}")
+        finally:
+            self._refreshing = False
+            connection.close()  # this thread's connection would otherwise leak
+
+
+def _warmup_input(classifier, batch_size):
+    """A zero-filled model input of *batch_size* images for warm-up runs."""
+    x = classifier.new_input_buffer(batch_size)
+    x.fill(0)
+    return x
+
+
+registry = ModelRegistry()
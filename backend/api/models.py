@@ -137,6 +137,10 @@ class ModelVersion(models.Model):
     model_parameters = models.TextField()
     is_active = models.BooleanField(default=True)
     framework_used = models.CharField(max_length=50)
+    artifact_path = models.CharField(
+        max_length=255, blank=True, default='',
+        help_text="ONNX file served by the model registry (relative to BASE_DIR); blank for the CV pipeline"
+    )
     
     def __str__(self):
         return f"Model v{self.version_number}"
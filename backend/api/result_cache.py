@@ -0,0 +1,230 @@
+"""
+Content-addressed cache of fingerprint analysis results.
+
+Entries are keyed by the SHA-256 of the image bytes, the model that produced
+the result (registry ModelVersion or CV pipeline) and the pipeline
+parameters, so the same capture uploaded from the web, desktop and mobile
+clients is only analysed once per model.  Payloads are stored as JSON, which
+keeps every backend interchangeable:
+
+* ``memory`` – per-process LRU (default)
+* ``file``   – JSON files in a directory shared by the workers on one host
+* ``django`` – any configured Django cache alias (Redis, Memcached…)
+* ``none``   – caching disabled
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+def _json_default(obj):
+    # NumPy scalars/arrays that slipped into a payload
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    return str(obj)
+
+
+class MemoryLRUBackend:
+    """Thread-safe in-process LRU holding at most *max_entries* payloads."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def count(self):
+        return len(self._data)
+
+
+class FileBackend:
+    """One JSON file per entry; least recently read files are evicted."""
+
+    EVICT_EVERY = 32  # directory scans are amortised over this many writes
+
+    def __init__(self, directory, max_entries=1024):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                value = f.read()
+            os.utime(path)  # mark as recently used
+            return value
+        except OSError:
+            return None
+
+    def set(self, key, value):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(value)
+        os.replace(tmp, self._path(key))
+        with self._lock:
+            self._writes += 1
+            due = self._writes % self.EVICT_EVERY == 0
+        if due:
+            self._evict()
+
+    def _evict(self):
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.name.endswith('.json')]
+        except OSError:
+            return
+        excess = len(entries) - self.max_entries
+        if excess <= 0:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:excess]:
+            try:
+                os.unlink(entry.path)
+            except OSError:
+                pass
+
+    def clear(self):
+        try:
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.json'):
+                    os.unlink(entry.path)
+        except OSError:
+            pass
+
+    def count(self):
+        try:
+            return sum(1 for e in os.scandir(self.directory) if e.name.endswith('.json'))
+        except OSError:
+            return 0
+
+
+class DjangoCacheBackend:
+    """Delegate to a Django cache alias; size limits are the cache's own."""
+
+    def __init__(self, alias='default', timeout=None):
+        from django.core.cache import caches
+
+        self.cache = caches[alias]
+        self.timeout = timeout
+
+    def get(self, key):
+        return self.cache.get(f"analysis:{key}")
+
+    def set(self, key, value):
+        self.cache.set(f"analysis:{key}", value, timeout=self.timeout)
+
+    def clear(self):
+        # Shared with the rest of the site – stale entries are unreachable
+        # anyway because the model is part of every key.
+        pass
+
+    def count(self):
+        return None  # not exposed by Django's cache API
+
+
+class AnalysisResultCache:
+    """
+    Cache of analysis payloads keyed by image content, model and parameters.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        config = getattr(settings, 'ANALYSIS_CACHE', {})
+        name = config.get('BACKEND', 'memory')
+        max_entries = config.get('MAX_ENTRIES', 1024)
+        if name == 'none':
+            return cls(None)
+        if name == 'memory':
+            return cls(MemoryLRUBackend(max_entries))
+        if name == 'file':
+            directory = config.get('LOCATION') or os.path.join(settings.BASE_DIR, 'analysis_cache')
+            return cls(FileBackend(directory, max_entries))
+        if name == 'django':
+            return cls(DjangoCacheBackend(config.get('CACHE_ALIAS', 'default'), config.get('TIMEOUT')))
+        raise ValueError(f"Unknown ANALYSIS_CACHE backend {name!r}")
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    @staticmethod
+    def make_key(image_digest, model_key, params):
+        """Combine the image hash, model identity and parameters into one key."""
+        material = json.dumps([image_digest, model_key, params], sort_keys=True, default=str)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return a fresh copy of the cached payload, or ``None``."""
+        value = self.backend.get(key) if self.backend is not None else None
+        with self._lock:
+            if value is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, payload):
+        if self.backend is not None:
+            self.backend.set(key, json.dumps(payload, default=_json_default))
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'backend': type(self.backend).__name__ if self.backend is not None else None,
+                'entries': self.backend.count() if self.backend is not None else 0,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def hash_file(path):
+    """Return ``(sha256 hex digest, bytes)`` of the file at *path*.
+
+    The bytes are returned too so the caller can decode them without reading
+    the upload from disk a second time.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    return hashlib.sha256(data).hexdigest(), data
+
+
+analysis_cache = AnalysisResultCache.from_settings()
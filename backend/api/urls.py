@@ -14,7 +14,7 @@ from .views import (
     admin_list_roles, admin_create_role, admin_update_role, admin_delete_role,
     admin_get_permissions, admin_get_user_groups,
     get_user_analysis_history, get_analysis_detail, delete_user_analysis, bulk_delete_user_analyses,
-    get_analytics_data, get_dashboard_stats,
+    get_analytics_data, get_dashboard_stats, get_ml_inference_stats, activate_model_version,
     # Export functionality
     export_analysis_pdf, export_user_history_csv, export_bulk_analysis_pdf,
     # Feedback system
@@ -34,6 +34,7 @@ urlpatterns = [
     path('register/', views.register_user, name='register'),
     path('login/', views.CustomAuthToken.as_view(), name='login'),
     path('fingerprint/analyze/', views.FingerprintAnalysisView.as_view(), name='analyze_fingerprint'),
+    path('fingerprint/capture-quality/', views.check_capture_quality, name='check_capture_quality'),
     # Expert application URLs
     path('expert-application/submit/', views.submit_expert_application, name='submit_expert_application'),
     path('expert-application/status/', views.get_user_expert_application, name='get_user_expert_application'),
@@ -62,6 +63,8 @@ urlpatterns = [
     # Analytics and dashboard URLs
     path('admin/analytics/', get_analytics_data, name='get_analytics_data'),
     path('dashboard/stats/', get_dashboard_stats, name='get_dashboard_stats'),
+    path('admin/ml/stats/', get_ml_inference_stats, name='get_ml_inference_stats'),
+    path('admin/ml/models/<int:version_id>/activate/', activate_model_version, name='activate_model_version'),
     
     # Export functionality URLs
     path('export/analysis/<int:analysis_id>/pdf/', export_analysis_pdf, name='export_analysis_pdf'),
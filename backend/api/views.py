@@ -23,48 +23,79 @@ import tempfile
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 from io import BytesIO
-from PIL import Image
 import traceback
 from django.db import models
 from django.http import HttpResponse
+from django.conf import settings
 
-# Import the new image processing capabilities
-from .image_processing import FingerprintImageProcessor, FingerprintMerger
-
-# ---------------------------------------------------------------------------
-# ML model (ONNX) – load once at startup (optional)
-# ---------------------------------------------------------------------------
-
-try:
-    from pathlib import Path
-    from django.conf import settings
-    from backend.ml import FingerClassifier, load_checkpoint, save_onnx  # type: ignore
-
-    _ONNX_MODEL_PATH = Path(settings.BASE_DIR) / "mobilenet_v2_best.onnx"
-    _PTH_MODEL_PATH = Path(settings.BASE_DIR) / "mobilenet_v2_best.pth"
-
-    if _ONNX_MODEL_PATH.exists():
-        _FINGER_MODEL = FingerClassifier(_ONNX_MODEL_PATH)
-    elif _PTH_MODEL_PATH.exists():
-        # Convert to ONNX on-the-fly then load
-        print("[ML] ONNX model not found but .pth checkpoint present – exporting to ONNX…")
-        model = load_checkpoint(_PTH_MODEL_PATH, device="cpu")
-        save_onnx(model, _ONNX_MODEL_PATH)
-        _FINGER_MODEL = FingerClassifier(_ONNX_MODEL_PATH)
-    else:
-        _FINGER_MODEL = None
+# Heavy dependencies (OpenCV, onnxruntime, torch, reportlab) are imported on
+# first use so that worker boot and management commands stay fast.
+from .model_registry import registry as model_registry
+from .result_cache import analysis_cache, hash_file
 
-    if _FINGER_MODEL:
-        print(f"[ML] ONNX fingerprint model loaded from {_ONNX_MODEL_PATH}")
-    else:
-        print("[ML] No fingerprint ML model found – falling back to CV pipeline")
-except Exception as _e:
-    print(f"[ML] Failed to load ONNX model: {_e}")
-    _FINGER_MODEL = None
+CV_MODEL_TYPE = "DabaFing CV Analysis v1.0"
+ANALYSIS_TOP_K = 3
+
+# Results cached for a replaced model can never be hit again; drop them
+model_registry.add_listener(lambda loaded_model: analysis_cache.clear())
 
 
 # --- Enhanced Analysis Function ---
 def perform_fingerprint_analysis(image_path):
+    """
+    Perform fingerprint analysis, reusing the cached result when the same
+    image has already been analysed by the same model and parameters.
+    """
+    import time
+
+    loaded_model = model_registry.active()
+    if not analysis_cache.enabled:
+        return _run_fingerprint_analysis(image_path, loaded_model)
+
+    t0 = time.time()
+    try:
+        image_digest, image_bytes = hash_file(image_path)
+    except OSError:
+        return _run_fingerprint_analysis(image_path, loaded_model)
+
+    if loaded_model is not None:
+        model_key = f"onnx:{loaded_model.version.pk}:{loaded_model.version.version_number}"
+        expected_model_type = loaded_model.version.version_number
+    else:
+        model_key = expected_model_type = CV_MODEL_TYPE
+    cache_key = analysis_cache.make_key(image_digest, model_key, _analysis_params())
+
+    cached = analysis_cache.get(cache_key)
+    if cached is not None:
+        # Report what this request cost (hashing and lookup), keeping the
+        # time the cached analysis originally took
+        details = cached.setdefault("analysis_details", {})
+        details["cache_hit"] = True
+        details["cached_processing_time"] = cached.get("processing_time")
+        cached["processing_time"] = f"{time.time() - t0:.2f}s"
+        return cached
+
+    result = _run_fingerprint_analysis(image_path, loaded_model, image_bytes)
+    # Only cache what the keyed model produced – not a CV/mock fallback
+    if result.get("analysis_details", {}).get("model_type") == expected_model_type:
+        analysis_cache.set(cache_key, result)
+    return result
+
+
+def _analysis_params():
+    """Pipeline parameters that change the analysis output (part of the cache key)."""
+    return {
+        "top_k": ANALYSIS_TOP_K,
+        "denoise_mode": getattr(settings, "CV_DENOISE_MODE", "bilateral"),
+        "target_ridge_period": getattr(settings, "CV_TARGET_RIDGE_PERIOD", 9.0),
+        "coarse_size": getattr(settings, "CV_COARSE_SIZE", 512),
+        "min_block_quality": getattr(settings, "CV_MIN_BLOCK_QUALITY", 0),
+        "min_quality_score": getattr(settings, "CV_MIN_QUALITY_SCORE", 0),
+        "cache_version": getattr(settings, "ANALYSIS_CACHE", {}).get("VERSION", 1),
+    }
+
+
+def _run_fingerprint_analysis(image_path, loaded_model, image_bytes=None):
     """
     Perform fingerprint analysis using computer vision (fallback) or ONNX model if available
     """
@@ -74,21 +105,45 @@ def perform_fingerprint_analysis(image_path):
     # ------------------------------------------------------------------
     # 1) Fast path – use ONNX model if it was successfully loaded
     # ------------------------------------------------------------------
-    if _FINGER_MODEL is not None:
+    if loaded_model is not None:
         try:
             t0 = time.time()
-            label, ridge_count, probs = _FINGER_MODEL.analyse(image_path)
+            # The model classifies whatever it is given; when the quality gate
+            # is on, grade the capture first
+            screening = {"rejection_reason": None, "quality_map": None}
+            if getattr(settings, "CV_MIN_QUALITY_SCORE", 0) > 0:
+                screening = _screen_capture(image_path, image_bytes)
+            if screening["rejection_reason"]:
+                return {
+                    "classification": "Unusable",
+                    "ridge_count": 0,
+                    "confidence_score": 0.0,
+                    "processing_time": f"{time.time() - t0:.2f}s",
+                    "analysis_details": {
+                        "message": screening["rejection_reason"],
+                        "model_type": loaded_model.version.version_number,
+                        "capture_rejected": True,
+                        "quality_map": screening["quality_map"],
+                    },
+                }
+
+            # Decode the bytes already read for hashing instead of re-reading the file
+            result = loaded_model.analyse(image_bytes if image_bytes is not None else image_path, top_k=ANALYSIS_TOP_K)
             processing_time_taken = time.time() - t0
 
             return {
-                "classification": label,
-                "ridge_count": int(round(ridge_count)),
-                "confidence_score": float(max(probs)),
+                "classification": result.label,
+                "ridge_count": int(round(result.ridge_count)),
+                "confidence_score": float(max(result.probabilities)),
                 "processing_time": f"{processing_time_taken:.2f}s",
                 "analysis_details": {
                     "message": "Inference via ONNX model",
-                    "model_type": "MobileNetMultiTask (ONNX)",
-                    "probabilities": probs.tolist(),
+                    "model_type": loaded_model.version.version_number,
+                    "probabilities": result.probabilities.tolist(),
+                    "top_predictions": [
+                        {"label": label, "probability": prob} for label, prob in result.top_k
+                    ],
+                    "quality_map": screening["quality_map"],
                 },
             }
         except Exception as _ml_err:
@@ -102,17 +157,22 @@ def perform_fingerprint_analysis(image_path):
     start_time = time.time()
     
     try:
-        # Initialize the image processor
+        from .image_processing import FingerprintImageProcessor
+
+        # Initialize the image processor; one pipeline run shares the decoded,
+        # normalized and denoised image between preprocessing and analysis
         processor = FingerprintImageProcessor()
+        run = processor.start(image_path, image_bytes)
+        processor.compute(run)
         
         # Perform image preprocessing
-        preprocessing_result = processor.preprocess_image(image_path)
+        preprocessing_result = processor.preprocess_image(image_path, run=run)
         
         if not preprocessing_result['success']:
             raise Exception(f"Preprocessing failed: {preprocessing_result.get('error', 'Unknown error')}")
         
         # Perform ridge detection and minutiae analysis
-        analysis_result = processor.detect_ridges_and_minutiae(image_path)
+        analysis_result = processor.detect_ridges_and_minutiae(image_path, run=run)
         
         if not analysis_result['success']:
             raise Exception(f"Ridge analysis failed: {analysis_result.get('error', 'Unknown error')}")
@@ -120,6 +180,23 @@ def perform_fingerprint_analysis(image_path):
         end_time = time.time()
         processing_time_taken = end_time - start_time
         
+        if analysis_result.get('rejection_reason'):
+            # No print, or one too poor to analyse: the analysis stages were skipped
+            return {
+                "classification": "Unusable",
+                "ridge_count": 0,
+                "confidence_score": 0.0,
+                "processing_time": f"{processing_time_taken:.2f}s",
+                "analysis_details": {
+                    "message": analysis_result['rejection_reason'],
+                    "model_type": CV_MODEL_TYPE,
+                    "capture_rejected": True,
+                    "quality_metrics": preprocessing_result.get('quality_metrics', {}),
+                    "quality_map": preprocessing_result.get('quality_map'),
+                    "stage_timings": run.timings
+                }
+            }
+        
         # Determine classification based on ridge patterns
         classification = determine_classification(analysis_result)
         
@@ -134,14 +211,17 @@ def perform_fingerprint_analysis(image_path):
             "processing_time": f"{processing_time_taken:.2f}s",
             "analysis_details": {
                 "message": "Advanced computer vision analysis complete",
-                "model_type": "DabaFing CV Analysis v1.0",
+                "model_type": CV_MODEL_TYPE,
+                "ridge_count_segments": analysis_result.get('ridge_count_segments', []),
                 "core_points": analysis_result.get('core_points', []),
                 "delta_points": analysis_result.get('delta_points', []),
                 "minutiae_points": analysis_result.get('minutiae_points', []),
                 "quality_metrics": quality_metrics,
+                "quality_map": preprocessing_result.get('quality_map'),
                 "ridge_pattern_analysis": analysis_result.get('ridge_pattern_analysis', {}),
                 "enhanced_image_path": preprocessing_result.get('enhanced_image_path'),
-                "preprocessing_steps": preprocessing_result.get('preprocessing_steps', [])
+                "preprocessing_steps": preprocessing_result.get('preprocessing_steps', []),
+                "stage_timings": run.timings
             }
         }
         
@@ -150,6 +230,21 @@ def perform_fingerprint_analysis(image_path):
         print(f"Advanced analysis failed, falling back to mock: {str(e)}")
         return perform_mock_analysis_fallback(image_path)
 
+def _screen_capture(image_path, image_bytes=None):
+    """
+    CV quality gate for the ONNX branch: rejection reason and quality map of
+    the capture, from the cheap front end of the CV pipeline only. A failing
+    check does not block the analysis.
+    """
+    from .image_processing import FingerprintImageProcessor
+
+    try:
+        processor = FingerprintImageProcessor()
+        return processor.screen_capture(processor.start(image_path, image_bytes))
+    except Exception as e:
+        print(f"Capture screening failed, analysing without the quality gate: {str(e)}")
+        return {"rejection_reason": None, "quality_map": None}
+
 def perform_mock_analysis_fallback(image_path):
     """
     Fallback mock analysis function
@@ -196,6 +291,10 @@ def determine_classification(analysis_result):
         elif num_cores == 1 and num_deltas == 0:
             return "Tented Arch"
         elif num_cores == 1 and num_deltas == 1:
+            # Poincaré cores and deltas: a delta straight below the core is a tented arch
+            core, delta = core_points[0], delta_points[0]
+            if abs(delta['x'] - core['x']) < 0.25 * abs(delta['y'] - core['y']):
+                return "Tented Arch"
             return "Loop"
         elif num_cores >= 2 or num_deltas >= 2:
             return "Whorl"
@@ -273,9 +372,19 @@ class FingerprintAnalysisView(APIView):
             image_path = fingerprint_image_instance.image.path
             analysis_results_data = perform_fingerprint_analysis(image_path)
 
+            details = analysis_results_data.get("analysis_details", {})
+            if details.get("capture_rejected"):
+                return Response({
+                    "detail": details.get("message", "The fingerprint capture is not usable."),
+                    "status": "error",
+                    "fingerprint_id": fingerprint_image_instance.id,
+                    "quality_metrics": details.get("quality_metrics"),
+                    "quality_map": details.get("quality_map")
+                }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
             model_version_str = analysis_results_data.get("analysis_details", {}).get("model_type", "1.0-cv-analysis")
-            model_version, _ = ModelVersion.objects.get_or_create(
-                version_number=model_version_str,
+            model_version = model_registry.model_version(
+                model_version_str,
                 defaults={
                     "release_date": timezone.now(),
                     "accuracy_score": analysis_results_data.get("confidence_score", 0.0) * 100,
@@ -1758,6 +1867,79 @@ def get_dashboard_stats(request):
             'status': 'error'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_ml_inference_stats(request):
+    """
+    Get ML inference scheduler statistics (admin only)
+    """
+    user = request.user
+    
+    # Check if user is admin
+    if not (hasattr(user, 'profile') and user.profile.role and user.profile.role.role_name == UserRole.ROLE_ADMIN):
+        return Response({
+            'detail': 'Permission denied. Admin access required.',
+            'status': 'error'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    return Response({
+        **model_registry.stats(),
+        'result_cache': analysis_cache.stats(),
+        'status': 'success'
+    }, status=status.HTTP_200_OK)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def activate_model_version(request, version_id):
+    """
+    Make a registry-managed ModelVersion the active model (admin only).
+    The model is loaded and warmed up in this worker before the switch;
+    other workers pick the change up on their next registry refresh.
+    """
+    user = request.user
+    
+    # Check if user is admin
+    if not (hasattr(user, 'profile') and user.profile.role and user.profile.role.role_name == UserRole.ROLE_ADMIN):
+        return Response({
+            'detail': 'Permission denied. Admin access required.',
+            'status': 'error'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    try:
+        version = ModelVersion.objects.get(id=version_id)
+    except ModelVersion.DoesNotExist:
+        return Response({
+            'detail': 'Model version not found.',
+            'status': 'error'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    if not version.artifact_path:
+        return Response({
+            'detail': 'Model version has no model artifact to serve.',
+            'status': 'error'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        # Load and warm up first so a broken artifact never becomes active
+        model_registry.activate(version)
+        with transaction.atomic():
+            ModelVersion.objects.exclude(artifact_path='').exclude(id=version.id).update(is_active=False)
+            version.is_active = True
+            version.release_date = timezone.now()
+            version.save(update_fields=['is_active', 'release_date'])
+    except Exception as e:
+        print(f"Error in activate_model_version: {str(e)}")
+        traceback.print_exc()
+        return Response({
+            'detail': f'Failed to activate model version: {str(e)}',
+            'status': 'error'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    return Response({
+        **model_registry.stats(),
+        'status': 'success'
+    }, status=status.HTTP_200_OK)
+
 # ==================== EXPORT FUNCTIONALITY ====================
 
 @api_view(['GET'])
@@ -1984,6 +2166,76 @@ def get_user_feedback_history(request):
             'status': 'error'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+# ==================== CAPTURE QUALITY CHECK ====================
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def check_capture_quality(request):
+    """
+    Score a raw capture frame before it is uploaded, for capture loops.
+
+    The frame is sent as the ``image`` field of a multipart form or as the
+    raw request body (``Content-Type: image/*`` or
+    ``application/octet-stream``). Nothing is stored: the frame is graded in
+    memory and the response carries the quality score, whether the capture
+    is worth analysing and guidance for retaking it.
+    """
+    from django.core.exceptions import RequestDataTooBig
+    from .image_processing import FingerprintImageProcessor
+
+    max_bytes = getattr(settings, 'CV_CAPTURE_CHECK_MAX_BYTES', 2621440)
+    too_large = Response({
+        'detail': f'Capture frames are limited to {max_bytes // 1024} KB; send a preview-sized frame.',
+        'status': 'error'
+    }, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    try:
+        if request.content_type.startswith('multipart/'):
+            upload = request.FILES.get('image')
+            if upload is None:
+                return Response({
+                    'detail': 'An image file is required in the "image" field.',
+                    'status': 'error'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            if upload.size > max_bytes:
+                return too_large
+            image_bytes = upload.read()
+        else:
+            image_bytes = request.body
+    except RequestDataTooBig:
+        return too_large
+
+    if not image_bytes:
+        return Response({
+            'detail': 'The request does not contain an image.',
+            'status': 'error'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if len(image_bytes) > max_bytes:
+        return too_large
+
+    result = FingerprintImageProcessor().assess_capture(image_bytes)
+    if result.get('too_large'):
+        return Response({
+            'detail': f"{result['error']}; send a preview-sized frame.",
+            'status': 'error',
+            'guidance': result['guidance']
+        }, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+    if not result['success']:
+        return Response({
+            'detail': f"Unable to read the image: {result.get('error', 'unknown error')}",
+            'status': 'error',
+            'guidance': result['guidance']
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    budget_ms = getattr(settings, 'CV_CAPTURE_CHECK_BUDGET_MS', 50)
+    result['latency_budget_ms'] = budget_ms
+    result['within_budget'] = result['elapsed_ms'] <= budget_ms
+    if not result['within_budget']:
+        print(f"Capture check took {result['elapsed_ms']:.1f} ms (budget {budget_ms} ms) "
+              f"for a {len(image_bytes) // 1024} KB frame")
+    result['status'] = 'success'
+    return Response(result, status=status.HTTP_200_OK)
+
 # ==================== FINGERPRINT MERGING FUNCTIONALITY ====================
 
 @api_view(['POST'])
@@ -2019,6 +2271,8 @@ def merge_fingerprint_parts(request):
                 'status': 'error'
             }, status=status.HTTP_404_NOT_FOUND)
         
+        from .image_processing import FingerprintMerger
+
         # Initialize merger
         merger = FingerprintMerger()
         
@@ -2135,10 +2389,20 @@ def analyze_merged_fingerprint(request, merged_id):
         # Use the enhanced analysis function
         analysis_results_data = perform_fingerprint_analysis(merged_fingerprint.merged_image.path)
         
+        details = analysis_results_data.get('analysis_details', {})
+        if details.get('capture_rejected'):
+            return Response({
+                'detail': details.get('message', 'The merged fingerprint is not usable.'),
+                'status': 'error',
+                'merged_fingerprint_id': merged_fingerprint.id,
+                'quality_metrics': details.get('quality_metrics'),
+                'quality_map': details.get('quality_map')
+            }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        
         # Create model version for merged analysis
         model_version_str = f"Merged-{analysis_results_data.get('analysis_details', {}).get('model_type', '1.0-cv-analysis')}"
-        model_version, _ = ModelVersion.objects.get_or_create(
-            version_number=model_version_str,
+        model_version = model_registry.model_version(
+            model_version_str,
             defaults={
                 "release_date": timezone.now(),
                 "accuracy_score": analysis_results_data.get("confidence_score", 0.0) * 100,
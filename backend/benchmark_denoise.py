@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+"""
+Compare the denoise backends of the CV pipeline with the bilateral filter.
+
+For every image, each mode of ``api.cv.denoise`` is timed on the normalized
+image and its output is compared with the bilateral one: PSNR, the ridge
+clarity of the enhanced image the pipeline derives from it, and the mean
+orientation coherence of the ridge fields computed from it.
+
+    python benchmark_denoise.py                       # synthetic 800x750 scan
+    python benchmark_denoise.py scans/*.png --repeat 20
+    python benchmark_denoise.py scans/*.png --max-clarity-delta 2
+
+With ``--max-clarity-delta`` the script exits non-zero when a mode's mean
+ridge clarity differs from bilateral by more than that many points.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(BACKEND_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'daba_fing_backend.settings')
+
+
+def synthetic_scan(height=800, width=750, seed=0):
+    """Loop-like ridge pattern with sensor noise, for runs without sample scans."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    dx, dy = xx - width / 2, height * 0.4 - yy
+    distance = np.where(dy > 0, np.hypot(dx, dy), np.abs(dx))
+    img = 128 + 90 * np.cos(2 * np.pi * distance / 9.0) + rng.normal(0, 25, (height, width))
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def psnr(a, b):
+    import numpy as np
+
+    mse = float(np.mean((a.astype(np.float32) - b.astype(np.float32)) ** 2))
+    return float('inf') if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+
+def measure(image, name, repeat):
+    """Per-mode timing and parity figures for one grayscale *image*."""
+    from api.cv.denoise import DENOISE_BACKENDS, denoise
+    from api.cv.fields import compute_ridge_fields
+    from api.image_processing import FingerprintImageProcessor
+
+    normalized = FingerprintImageProcessor()._normalize_image(image)
+    results = {}
+    for mode in DENOISE_BACKENDS:
+        processor = FingerprintImageProcessor(denoise_mode=mode)
+        denoise(normalized, mode)  # warm-up
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            output = denoise(normalized, mode)
+            times.append((time.perf_counter() - start) * 1000)
+        enhanced = processor._apply_gaussian_filter(processor._enhance_contrast(output))
+        results[mode] = {
+            'output': output,
+            'ms': statistics.median(times),
+            'ridge_clarity': processor._calculate_ridge_clarity(enhanced),
+            'coherence': float(compute_ridge_fields(output).coherence.mean()),
+        }
+
+    reference = results['bilateral']
+    rows = []
+    for mode, r in results.items():
+        rows.append({
+            'image': name,
+            'mode': mode,
+            'ms': round(r['ms'], 2),
+            'speedup': round(reference['ms'] / r['ms'], 2) if r['ms'] else None,
+            'psnr_vs_bilateral': round(psnr(r['output'], reference['output']), 2),
+            'ridge_clarity': round(r['ridge_clarity'], 2),
+            'clarity_delta': round(r['ridge_clarity'] - reference['ridge_clarity'], 2),
+            'coherence': round(r['coherence'], 3),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('images', nargs='*', help='grayscale fingerprint images (default: synthetic scan)')
+    parser.add_argument('--repeat', type=int, default=10, help='timed runs per mode (median reported)')
+    parser.add_argument('--max-clarity-delta', type=float, help='fail when a mode drifts further from bilateral')
+    parser.add_argument('--json', action='store_true', help='print raw JSON')
+    args = parser.parse_args()
+
+    import django
+    django.setup()
+    import cv2
+
+    rows = []
+    if not args.images:
+        rows += measure(synthetic_scan(), 'synthetic', args.repeat)
+    for path in args.images:
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            print(f"Skipping unreadable image {path}")
+            continue
+        rows += measure(image, os.path.basename(path), args.repeat)
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print(f"{'image':<24} {'mode':<12} {'ms':>8} {'speedup':>8} {'PSNR dB':>8} {'clarity':>8} {'delta':>7} {'coherence':>9}")
+        for r in rows:
+            print(f"{r['image']:<24} {r['mode']:<12} {r['ms']:>8.2f} {r['speedup']:>8.2f} "
+                  f"{r['psnr_vs_bilateral']:>8.2f} {r['ridge_clarity']:>8.2f} {r['clarity_delta']:>+7.2f} {r['coherence']:>9.3f}")
+
+    if args.max_clarity_delta is None:
+        return 0
+    drift = {}
+    for r in rows:
+        drift.setdefault(r['mode'], []).append(r['clarity_delta'])
+    over = [f"{mode} {statistics.mean(deltas):+.2f}" for mode, deltas in drift.items()
+            if abs(statistics.mean(deltas)) > args.max_clarity_delta]
+    if over:
+        print(f"Ridge clarity outside ±{args.max_clarity_delta} of bilateral: {', '.join(over)}")
+        return 1
+    print("All modes within ridge clarity tolerance.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
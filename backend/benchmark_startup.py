@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""
+Measure import time and resident memory of backend modules.
+
+Each module is imported in a fresh interpreter (after ``django.setup()``) so
+the numbers are what a worker pays when it is the first to import it.
+
+    python benchmark_startup.py                    # default module list
+    python benchmark_startup.py api.views cv2      # specific modules
+    python benchmark_startup.py --budget-ms 1500 --budget-mb 150
+
+With a budget the script exits non-zero when ``api.urls`` (what a worker
+imports at boot) exceeds it, so it can gate CI or deploys.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_MODULES = [
+    'api.urls',
+    'api.views',
+    'api.image_processing',
+    'api.utils',
+    'backend.ml',
+    'backend.ml.inference',
+    'backend.ml.model',
+    'cv2',
+    'PIL.Image',
+    'reportlab.platypus',
+    'onnxruntime',
+    'torch',
+]
+
+# Runs in the child interpreter; prints one JSON line
+_PROBE = r'''
+import json, os, resource, sys, time
+sys.path.insert(0, {backend!r})
+sys.path.insert(0, os.path.dirname({backend!r}))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'daba_fing_backend.settings')
+
+def rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+
+import django
+django.setup()
+base_rss = rss_mb()
+base_modules = set(sys.modules)
+start = time.perf_counter()
+error = None
+try:
+    __import__({module!r})
+except Exception as e:
+    error = f"{{type(e).__name__}}: {{e}}"
+elapsed = (time.perf_counter() - start) * 1000
+heavy = [m for m in ('torch', 'torchvision', 'onnxruntime', 'cv2', 'reportlab', 'PIL')
+         if m in sys.modules and m not in base_modules]
+print(json.dumps({{
+    'module': {module!r},
+    'import_ms': round(elapsed, 1),
+    'rss_mb': round(rss_mb() - base_rss, 1),
+    'heavy_imports': heavy,
+    'error': error,
+}}))
+'''
+
+
+def measure(module):
+    """Import *module* in a clean interpreter and return its measurements."""
+    probe = _PROBE.format(backend=BACKEND_DIR, module=module)
+    proc = subprocess.run(
+        [sys.executable, '-c', probe], cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith('{'):
+            return json.loads(line)
+    return {'module': module, 'import_ms': None, 'rss_mb': None, 'heavy_imports': [],
+            'error': (proc.stderr.strip().splitlines() or ['unknown error'])[-1]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('modules', nargs='*', default=DEFAULT_MODULES)
+    parser.add_argument('--budget-ms', type=float, help='max import time for api.urls')
+    parser.add_argument('--budget-mb', type=float, help='max RSS growth for api.urls')
+    parser.add_argument('--json', action='store_true', help='print raw JSON')
+    args = parser.parse_args()
+
+    results = [measure(module) for module in args.modules]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'module':<26} {'import ms':>10} {'RSS MB':>8}  heavy imports")
+        for r in results:
+            if r['error']:
+                print(f"{r['module']:<26} {'-':>10} {'-':>8}  {r['error']}")
+            else:
+                heavy = ', '.join(r['heavy_imports']) or '-'
+                print(f"{r['module']:<26} {r['import_ms']:>10.1f} {r['rss_mb']:>8.1f}  {heavy}")
+
+    if args.budget_ms is None and args.budget_mb is None:
+        return 0
+    boot = next((r for r in results if r['module'] == 'api.urls'), None) or measure('api.urls')
+    if boot['error']:
+        print(f"api.urls failed to import: {boot['error']}")
+        return 1
+    over = []
+    if args.budget_ms is not None and boot['import_ms'] > args.budget_ms:
+        over.append(f"{boot['import_ms']:.1f} ms > {args.budget_ms:.1f} ms")
+    if args.budget_mb is not None and boot['rss_mb'] > args.budget_mb:
+        over.append(f"{boot['rss_mb']:.1f} MB > {args.budget_mb:.1f} MB")
+    if over:
+        print(f"Worker start over budget: {'; '.join(over)}")
+        return 1
+    print("Worker start within budget.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
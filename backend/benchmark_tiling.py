@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+"""
+Check that the tiled CV stages reproduce their whole-image results.
+
+Every stage the processor runs through ``api.cv.tiling`` is computed on the
+whole image and tile by tile, timed both ways, and the largest absolute
+difference is compared with the stage's tolerance:
+
+    denoise (each mode)   identical
+    Gabor responses       float rounding (relative to the largest response)
+    CLAHE                 one grey level
+
+The default images are synthetic scans whose sides are, and are not,
+multiples of the CLAHE grid.
+
+    python benchmark_tiling.py                        # synthetic scans
+    python benchmark_tiling.py scans/*.png --tile-size 256 --workers 4
+
+The script exits non-zero when a stage exceeds its tolerance.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(BACKEND_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'daba_fing_backend.settings')
+
+# Sides that divide the 8x8 CLAHE grid, that do not, and one of each
+SYNTHETIC_SIZES = [(1536, 1280), (1503, 1405), (1500, 1400), (1400, 1503)]
+
+TOLERANCES = {'denoise': 0.0, 'gabor': 1e-5, 'clahe': 1.0}
+
+
+def timed(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = func()
+        times.append((time.perf_counter() - start) * 1000)
+    return output, statistics.median(times)
+
+
+def measure(image, name, executor, repeat):
+    """Whole-image and tiled timing and largest difference of every tiled stage of *image*."""
+    import cv2
+    import numpy as np
+
+    from api.cv.denoise import DENOISE_BACKENDS, DENOISE_HALOS, denoise
+    from api.cv.gabor import get_gabor_bank
+    from api.cv.tiling import tiled_clahe
+    from api.image_processing import FingerprintImageProcessor
+
+    normalized = FingerprintImageProcessor()._normalize_image(image)
+    bank = get_gabor_bank(FingerprintImageProcessor.gabor_orientations)
+    stages = [
+        (f'denoise:{mode}', 'denoise', lambda img, mode=mode: denoise(img, mode), DENOISE_HALOS[mode])
+        for mode in DENOISE_BACKENDS
+    ]
+    stages.append(('gabor', 'gabor', bank.apply, (bank.ksize // 2, 1)))
+
+    rows = []
+    for stage, kind, func, (halo, align) in stages:
+        whole, whole_ms = timed(lambda: func(normalized), repeat)
+        tiled, tiled_ms = timed(lambda: executor.map(func, normalized, halo, align), repeat)
+        rows.append((stage, kind, whole, whole_ms, tiled, tiled_ms))
+
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    whole, whole_ms = timed(lambda: clahe.apply(normalized), repeat)
+    tiled, tiled_ms = timed(lambda: tiled_clahe(executor, normalized), repeat)
+    rows.append(('clahe', 'clahe', whole, whole_ms, tiled, tiled_ms))
+
+    results = []
+    for stage, kind, whole, whole_ms, tiled, tiled_ms in rows:
+        difference = float(np.abs(whole.astype(np.float64) - tiled.astype(np.float64)).max())
+        if kind == 'gabor':
+            difference /= max(float(np.abs(whole).max()), 1e-12)
+        results.append({
+            'image': name,
+            'shape': list(image.shape),
+            'stage': stage,
+            'whole_ms': round(whole_ms, 2),
+            'tiled_ms': round(tiled_ms, 2),
+            'max_difference': difference,
+            'tolerance': TOLERANCES[kind],
+            'ok': difference <= TOLERANCES[kind],
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('images', nargs='*', help='grayscale fingerprint images (default: synthetic scans)')
+    parser.add_argument('--tile-size', type=int, default=512, help='tile side in pixels')
+    parser.add_argument('--workers', type=int, default=2, help='tile pool threads (at least 2 to tile)')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per stage (median reported)')
+    parser.add_argument('--json', action='store_true', help='print raw JSON')
+    args = parser.parse_args()
+
+    import django
+    django.setup()
+    import cv2
+
+    from api.cv.tiling import TileExecutor
+    from benchmark_denoise import synthetic_scan
+
+    executor = TileExecutor(args.tile_size, max(2, args.workers))
+    rows = []
+    if not args.images:
+        for height, width in SYNTHETIC_SIZES:
+            rows += measure(synthetic_scan(height, width), f'synthetic {height}x{width}', executor, args.repeat)
+    for path in args.images:
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            print(f"Skipping unreadable image {path}")
+            continue
+        rows += measure(image, os.path.basename(path), executor, args.repeat)
+    executor.shutdown()
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print(f"{'image':<24} {'stage':<20} {'whole ms':>9} {'tiled ms':>9} {'max diff':>10} {'tolerance':>9}")
+        for r in rows:
+            print(f"{r['image']:<24} {r['stage']:<20} {r['whole_ms']:>9.2f} {r['tiled_ms']:>9.2f} "
+                  f"{r['max_difference']:>10.4g} {r['tolerance']:>9.4g}{'' if r['ok'] else '  FAIL'}")
+
+    failed = [f"{r['stage']} on {r['image']} ({r['max_difference']:.4g})" for r in rows if not r['ok']]
+    if failed:
+        print(f"Tiled output outside tolerance: {', '.join(failed)}")
+        return 1
+    print("All tiled stages within tolerance.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -201,6 +201,108 @@ else:
     
 CORS_ALLOW_CREDENTIALS = True
 
+# Machine-learning inference
+# Largest number of images sent through the ONNX session in one run; longer
+# batch requests are split into chunks of this size.
+ML_MAX_BATCH_SIZE = int(os.getenv('ML_MAX_BATCH_SIZE', '32'))
+
+# Micro-batching of concurrent analysis requests: while other requests are
+# still being prepared, wait at most ML_BATCH_MAX_WAIT_MS for up to
+# ML_BATCH_MAX_SIZE of them, then run them as one forward pass. A lone
+# request (e.g. on a sync WSGI worker) is dispatched without waiting.
+ML_MICRO_BATCHING = os.getenv('ML_MICRO_BATCHING', 'True') == 'True'
+ML_BATCH_MAX_SIZE = int(os.getenv('ML_BATCH_MAX_SIZE', '8'))
+ML_BATCH_MAX_WAIT_MS = float(os.getenv('ML_BATCH_MAX_WAIT_MS', '5'))
+
+# Which artifact of mobilenet_v2_best.onnx to serve: fp32, int8-dynamic or
+# int8-static (produced by `python -m backend.ml.quantize`)
+ML_MODEL_VARIANT = os.getenv('ML_MODEL_VARIANT', 'fp32')
+
+# Export .pth checkpoints with preprocessing baked into the graph (uint8
+# HWC input); FingerClassifier detects either input format automatically
+ML_EXPORT_RAW_INPUT = os.getenv('ML_EXPORT_RAW_INPUT', 'True') == 'True'
+
+# ONNX Runtime session profile: default, latency, throughput or low_memory
+# (see backend/ml/session.py). "throughput" keeps each WSGI worker to one
+# core; "latency" gives a worker cores / WEB_CONCURRENCY threads.
+ML_SESSION_PROFILE = os.getenv('ML_SESSION_PROFILE', 'throughput')
+# Explicit thread counts override the profile when set
+ML_SESSION_OPTIONS = {
+    key: int(value)
+    for key, value in (
+        ('intra_op_num_threads', os.getenv('ML_INTRA_OP_THREADS')),
+        ('inter_op_num_threads', os.getenv('ML_INTER_OP_THREADS')),
+    )
+    if value
+}
+# Serialise the optimised graph next to the model and reuse it on restart.
+# The file is optimised at most at level "extended", which is portable across
+# CPUs, and named after the onnxruntime version, so it can live on a shared
+# mount or in an image; hardware-specific "all" passes run at every load.
+ML_CACHE_OPTIMIZED_MODEL = os.getenv('ML_CACHE_OPTIMIZED_MODEL', 'True') == 'True'
+# Bind outputs to preallocated buffers instead of allocating per run
+ML_IO_BINDING = os.getenv('ML_IO_BINDING', 'True') == 'True'
+
+# Model registry: warm-up inferences before a model is published, how often
+# workers check for a newly activated ModelVersion, and whether WSGI workers
+# load the model at boot rather than on the first analysis
+ML_WARMUP_RUNS = int(os.getenv('ML_WARMUP_RUNS', '2'))
+ML_REGISTRY_REFRESH_SECONDS = float(os.getenv('ML_REGISTRY_REFRESH_SECONDS', '30'))
+ML_PRELOAD = os.getenv('ML_PRELOAD', 'True') == 'True'
+
+# Edge-preserving smoother of the CV pipeline: bilateral, guided or
+# fast_guided (see api/cv/denoise.py; compare them with benchmark_denoise.py)
+CV_DENOISE_MODE = os.getenv('CV_DENOISE_MODE', 'bilateral')
+# CPU threads one worker process may use for CV work. The stage pool, the
+# tile pool and OpenCV's own threads nest, so they split this budget between
+# them (their product stays within it; see split_thread_budget in
+# api/cv/pipeline.py). Defaults to the cores divided among the
+# WEB_CONCURRENCY worker processes so workers do not oversubscribe the box.
+CV_THREAD_BUDGET = int(os.getenv('CV_THREAD_BUDGET', '0')) or max(
+    1, (os.cpu_count() or 1) // max(1, int(os.getenv('WEB_CONCURRENCY', '1'))))
+# Run independent analysis stages (Gabor, ridge fields, thinning, ...)
+# concurrently within the thread budget
+CV_PARALLEL_STAGES = os.getenv('CV_PARALLEL_STAGES', 'True') == 'True'
+# Scans with a side longer than CV_TILE_SIZE pixels are denoised, equalised
+# and Gabor-filtered in tiles on CV_TILE_WORKERS threads, taken out of
+# the thread budget before the stage pool (default 0: the budget when stages
+# run one at a time, otherwise 1; 1 disables tiling)
+CV_TILE_SIZE = int(os.getenv('CV_TILE_SIZE', '1024'))
+CV_TILE_WORKERS = int(os.getenv('CV_TILE_WORKERS', '0'))
+# Captures are located on a pyramid level of at most CV_COARSE_SIZE pixels a
+# side, cropped to the print and resampled so ridges are CV_TARGET_RIDGE_PERIOD
+# pixels apart (about 9 at 500 dpi); see api/cv/pyramid.py
+CV_TARGET_RIDGE_PERIOD = float(os.getenv('CV_TARGET_RIDGE_PERIOD', '9'))
+CV_COARSE_SIZE = int(os.getenv('CV_COARSE_SIZE', '512'))
+# Block quality map (0-100 per block, see api/cv/quality.py): minutiae are
+# only taken from blocks graded CV_MIN_BLOCK_QUALITY or better, and captures
+# whose overall score is below CV_MIN_QUALITY_SCORE are rejected with HTTP 422
+# before the analysis stages (and the ONNX model) run. Both are off (0) until
+# calibrated on the deployment's captures; with CV_MIN_QUALITY_SCORE at 0 the
+# ONNX branch does not grade captures at all.
+CV_MIN_BLOCK_QUALITY = int(os.getenv('CV_MIN_BLOCK_QUALITY', '0'))
+CV_MIN_QUALITY_SCORE = float(os.getenv('CV_MIN_QUALITY_SCORE', '0'))
+# Capture-quality endpoint for capture loops: largest frame accepted (bytes,
+# and pixels the frame decodes to: JPEG is decoded at up to 1/8 scale, other
+# formats in full) and the latency the check is expected to stay within
+# (slower checks are logged)
+CV_CAPTURE_CHECK_MAX_BYTES = int(os.getenv('CV_CAPTURE_CHECK_MAX_BYTES', str(2560 * 1024)))
+CV_CAPTURE_CHECK_MAX_PIXELS = int(os.getenv('CV_CAPTURE_CHECK_MAX_PIXELS', str(16 * 1000 * 1000)))
+CV_CAPTURE_CHECK_BUDGET_MS = float(os.getenv('CV_CAPTURE_CHECK_BUDGET_MS', '50'))
+
+# Content-hash cache of analysis results (see api/result_cache.py).
+# BACKEND: memory (per-process LRU), file (LOCATION directory), django
+# (CACHE_ALIAS of CACHES) or none. Bump VERSION when the CV pipeline changes
+# so persistent caches stop serving results of the old code.
+ANALYSIS_CACHE = {
+    'BACKEND': os.getenv('ANALYSIS_CACHE_BACKEND', 'memory'),
+    'MAX_ENTRIES': int(os.getenv('ANALYSIS_CACHE_MAX_ENTRIES', '1024')),
+    'LOCATION': os.getenv('ANALYSIS_CACHE_LOCATION', os.path.join(BASE_DIR, 'analysis_cache')),
+    'CACHE_ALIAS': os.getenv('ANALYSIS_CACHE_ALIAS', 'default'),
+    'TIMEOUT': int(os.getenv('ANALYSIS_CACHE_TIMEOUT', '86400')),
+    'VERSION': 7,
+}
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'daba_fing_backend.settings')
 
 application = get_wsgi_application()
+
+# Load and warm up the fingerprint model before the worker takes traffic
+from django.conf import settings  # noqa: E402
+
+if getattr(settings, 'ML_PRELOAD', False):
+    from api.model_registry import registry  # noqa: E402
+
+    registry.start()
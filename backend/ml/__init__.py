@@ -1,10 +1,47 @@
-from .model import MobileNetMultiTask, load_checkpoint
-from .onnx_export import save_onnx
-from .inference import FingerClassifier
-
-__all__ = [
-    "MobileNetMultiTask",
-    "load_checkpoint",
-    "save_onnx",
-    "FingerClassifier",
-] 
\ No newline at end of file
+"""Fingerprint ML package.
+
+Submodules are imported on first attribute access so that serving code,
+which only needs onnxruntime, never pays for torch/torchvision; those are
+imported only when ``MobileNetMultiTask``, ``load_checkpoint`` or the
+export helpers are actually used.
+"""
+
+from importlib import import_module
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .model import MobileNetMultiTask, load_checkpoint
+    from .onnx_export import RawInputModel, save_onnx
+    from .inference import FingerAnalysis, FingerClassifier
+    from .batching import MicroBatcher
+    from .session import MODEL_VARIANTS, SESSION_PROFILES, build_session, variant_path
+
+_EXPORTS = {
+    "MobileNetMultiTask": ".model",
+    "load_checkpoint": ".model",
+    "RawInputModel": ".onnx_export",
+    "save_onnx": ".onnx_export",
+    "FingerAnalysis": ".inference",
+    "FingerClassifier": ".inference",
+    "MicroBatcher": ".batching",
+    "MODEL_VARIANTS": ".session",
+    "SESSION_PROFILES": ".session",
+    "build_session": ".session",
+    "variant_path": ".session",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    try:
+        module = _EXPORTS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value  # cache: later lookups bypass __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
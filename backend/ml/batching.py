@@ -0,0 +1,188 @@
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from .inference import FingerAnalysis, FingerClassifier
+from .preprocess import ImageSource
+
+__all__ = ["MicroBatcher"]
+
+
+class _Pending(NamedTuple):
+    tensor: np.ndarray  # one row of the classifier's input
+    top_k: int
+    future: Future
+
+
+class MicroBatcher:
+    """Coalesce concurrent single-image requests into batched forward passes.
+
+    Callers decode (and normalise) their own image on their own thread, then
+    enqueue the tensor.  A background worker waits up to *max_wait_ms* for
+    more requests (or until *max_batch_size* are queued), runs them through
+    :meth:`FingerClassifier.analyse_preprocessed` in one ``session.run`` and
+    resolves each caller's future with its own row of the output.  It only
+    waits while another caller is still preparing its image, so a lone
+    request (e.g. on a synchronous WSGI worker) is dispatched at once.
+
+    The worker thread is started lazily on first use and restarted after a
+    ``fork()`` so the batcher can be created at import time in pre-forking
+    WSGI servers.  :meth:`close` stops it once queued requests are served.
+    """
+
+    def __init__(
+        self,
+        classifier: FingerClassifier,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.classifier = classifier
+        self.max_batch_size = min(max_batch_size, classifier.max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+
+        self._queue: "queue.Queue[Optional[_Pending]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_pid: Optional[int] = None
+        self._batch_sizes: Counter = Counter()
+        self._requests = 0
+        self._arriving = 0  # callers preparing an image, not yet queued
+        self._max_queue_depth = 0
+        self._closed = False
+
+    # ---------------------------------------------------------------------
+    # Public API
+    # ---------------------------------------------------------------------
+
+    def submit(self, image: ImageSource, top_k: int = 0) -> Future:
+        """Queue *image* for analysis and return a future of its result."""
+        with self._lock:
+            self._arriving += 1
+        try:
+            tensor = self.classifier.prepare(image)[0]
+            self._ensure_worker()
+        except BaseException:
+            with self._lock:
+                self._arriving -= 1
+            raise
+
+        future: Future = Future()
+        with self._lock:
+            self._arriving -= 1
+            if self._closed:
+                # Late caller still holding a replaced batcher: run unbatched
+                future.set_result(self.classifier.analyse_preprocessed(tensor[None], top_k=top_k)[0])
+                return future
+            self._queue.put(_Pending(tensor, top_k, future))
+            self._requests += 1
+            self._max_queue_depth = max(self._max_queue_depth, self._queue.qsize())
+        return future
+
+    def analyse(self, image: ImageSource, top_k: int = 0, timeout: Optional[float] = None) -> FingerAnalysis:
+        """Blocking drop-in for :meth:`FingerClassifier.analyse`."""
+        return self.submit(image, top_k=top_k).result(timeout=timeout)
+
+    def close(self) -> None:
+        """Stop the worker after every request queued so far has been served."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self._worker is not None and self._worker_pid == os.getpid():
+                self._queue.put(None)  # sentinel, queued behind pending requests
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth and batch-size histogram counters."""
+        with self._lock:
+            histogram = {size: self._batch_sizes[size] for size in sorted(self._batch_sizes)}
+            batches = sum(histogram.values())
+            items = sum(size * count for size, count in histogram.items())
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self._max_queue_depth,
+                "requests": self._requests,
+                "batches": batches,
+                "mean_batch_size": round(items / batches, 2) if batches else 0.0,
+                "batch_size_histogram": histogram,
+            }
+
+    # ---------------------------------------------------------------------
+    # Worker
+    # ---------------------------------------------------------------------
+
+    def _ensure_worker(self) -> None:
+        pid = os.getpid()
+        if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._closed or (self._worker is not None and self._worker_pid == pid and self._worker.is_alive()):
+                return
+            if self._worker_pid != pid:
+                # Inherited across fork: the parent's queue and thread are gone.
+                self._queue = queue.Queue()
+            self._worker = threading.Thread(target=self._run, name="finger-micro-batcher", daemon=True)
+            self._worker_pid = pid
+            self._worker.start()
+
+    def _run(self) -> None:
+        buffer = self.classifier.new_input_buffer(self.max_batch_size)
+        stopping = False
+        while not stopping:
+            batch = self._collect()
+            stopping = batch[-1] is None
+            if stopping:
+                batch.pop()
+            pending = [item for item in batch if item.future.set_running_or_notify_cancel()]
+            if not pending:
+                continue
+
+            with self._lock:
+                self._batch_sizes[len(pending)] += 1
+
+            x = buffer[:len(pending)]
+            np.stack([item.tensor for item in pending], out=x)
+            try:
+                results = self.classifier.analyse_preprocessed(x, top_k=max(item.top_k for item in pending))
+            except Exception as exc:  # propagate to every waiting caller
+                for item in pending:
+                    item.future.set_exception(exc)
+                continue
+
+            for item, result in zip(pending, results):
+                item.future.set_result(result._replace(top_k=result.top_k[:item.top_k]))
+
+    def _collect(self) -> List[Optional[_Pending]]:
+        """Block for one request, then gather more until full or timed out.
+
+        Queued requests are always taken; the worker only waits for more
+        while another caller is still preparing its image.  A ``None``
+        sentinel from :meth:`close` ends the batch early.
+        """
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if batch[-1] is None:  # close() sentinel: nothing follows it
+                break
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self._arriving:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
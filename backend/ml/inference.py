@@ -1,12 +1,22 @@
+import threading
 from pathlib import Path
-from typing import Dict, List
+from typing import Any, Dict, Iterator, List, Mapping, NamedTuple, Optional, Sequence, Tuple
 
-import onnxruntime as ort
 import numpy as np
 
-from .preprocess import preprocess, softmax
+from .preprocess import IMG_SIZE, ImageSource, pixels_into, preprocess_into, softmax
+from .session import build_session
 
-__all__ = ["FingerClassifier"]
+__all__ = ["FingerAnalysis", "FingerClassifier"]
+
+
+class FingerAnalysis(NamedTuple):
+    """Result of a single fused forward pass."""
+
+    label: str
+    ridge_count: float
+    probabilities: np.ndarray  # shape (C,)
+    top_k: List[Tuple[str, float]]
 
 
 class FingerClassifier:
@@ -21,12 +31,48 @@ class FingerClassifier:
     }
     INDEX_TO_CLASS: Dict[int, str] = {v: k for k, v in CLASS_MAP.items()}
 
-    def __init__(self, onnx_path: Path | str):
+    def __init__(
+        self,
+        onnx_path: Path | str,
+        max_batch_size: int = 32,
+        profile: str = "default",
+        session_options: Optional[Mapping[str, Any]] = None,
+        cache_optimized: bool = False,
+        io_binding: bool = False,
+    ):
+        """Load *onnx_path*.
+
+        *profile*, *session_options* and *cache_optimized* are forwarded to
+        :func:`~backend.ml.session.build_session`.  With *io_binding* the
+        float outputs are written into per-thread buffers preallocated for
+        each batch size instead of freshly allocated on every run.
+        """
         onnx_path = Path(onnx_path)
         if not onnx_path.exists():
             raise FileNotFoundError(f"ONNX model not found: {onnx_path}")
-        self.session = ort.InferenceSession(str(onnx_path))
-        self.input_name = self.session.get_inputs()[0].name
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.session = build_session(
+            onnx_path, profile=profile, overrides=session_options, cache_optimized=cache_optimized
+        )
+        input_meta = self.session.get_inputs()[0]
+        self.input_name = input_meta.name
+        # Graphs exported with ``save_onnx(raw_input=True)`` normalise
+        # internally and take decoded uint8 HWC pixels.
+        self.raw_input = input_meta.type == "tensor(uint8)"
+        if self.raw_input:
+            self.input_shape: Tuple[int, ...] = (IMG_SIZE, IMG_SIZE, 3)
+            self.input_dtype = np.uint8
+            self._fill = pixels_into
+        else:
+            self.input_shape = (3, IMG_SIZE, IMG_SIZE)
+            self.input_dtype = np.float32
+            self._fill = preprocess_into
+        self.output_names = [o.name for o in self.session.get_outputs()]
+        self.max_batch_size = max_batch_size
+        self.profile = profile
+        self.io_binding = io_binding and self._outputs_bindable()
+        self._buffers = threading.local()
 
     # ---------------------------------------------------------------------
     # Public API
@@ -34,10 +80,7 @@ class FingerClassifier:
 
     def predict_proba(self, image_path: str) -> np.ndarray:
         """Return class probabilities for *image_path*."""
-        x = preprocess(image_path)
-        outputs = self.session.run(None, {self.input_name: x})
-        logits = outputs[0]
-        # Robust: if logits has batch dim, remove it
+        logits, _ = self._forward(self.prepare(image_path))
         probs = softmax(logits, axis=1)
         return probs.squeeze(0)  # shape (C,)
 
@@ -53,21 +96,168 @@ class FingerClassifier:
 
     def predict_ridge_count(self, image_path: str) -> float:
         """Predict ridge count for *image_path*."""
-        x = preprocess(image_path)
-        outputs = self.session.run(None, {self.input_name: x})
-        # Regression output is assumed to be the second result
-        if len(outputs) < 2:
+        _, ridge = self._forward(self.prepare(image_path))
+        if ridge is None:
             raise RuntimeError("ONNX model does not expose ridge_count output")
-        ridge = float(outputs[1].squeeze())
-        return ridge
+        return float(ridge.squeeze())
 
-    def analyse(self, image_path: str):
-        """Full analysis returning label, ridge count, probability vector."""
-        probs = self.predict_proba(image_path)
+    def analyse(self, image_path: str, top_k: int = 0) -> FingerAnalysis:
+        """Full analysis returning label, ridge count, probability vector.
+
+        The image is decoded once and the session is run once; every field of
+        the result is read from the same pair of output tensors.  When *top_k*
+        is positive the *k* most probable ``(label, probability)`` pairs are
+        included as well.
+        """
+        logits, ridge = self._forward(self.prepare(image_path))
+        probs = softmax(logits, axis=1).squeeze(0)
+        ridge_count = float(ridge.squeeze()) if ridge is not None else 0.0
+        return self._decode(probs, ridge_count, top_k)
+
+    # -----------------------------------------------------------------
+    # Input preparation
+    # -----------------------------------------------------------------
+
+    def new_input_buffer(self, batch_size: int) -> np.ndarray:
+        """Allocate an uninitialised model input for *batch_size* images."""
+        return np.empty((batch_size, *self.input_shape), dtype=self.input_dtype)
+
+    def prepare_into(self, source: ImageSource, out: np.ndarray) -> np.ndarray:
+        """Decode *source* into one row of a buffer from :meth:`new_input_buffer`."""
+        return self._fill(source, out)
+
+    def prepare(self, source: ImageSource) -> np.ndarray:
+        """Return the model input for a single image (batch of 1)."""
+        x = self.new_input_buffer(1)
+        self.prepare_into(source, x[0])
+        return x
+
+    # -----------------------------------------------------------------
+    # Batched inference
+    # -----------------------------------------------------------------
+
+    def predict_proba_batch(
+        self, images: Sequence[ImageSource], batch_size: Optional[int] = None
+    ) -> np.ndarray:
+        """Return class probabilities for every item of *images*.
+
+        Items may be paths, encoded byte buffers or decoded arrays.  Lists
+        longer than *batch_size* (default: ``max_batch_size``) are processed
+        in chunks, one ``session.run`` per chunk.
+
+        Returns
+        -------
+        np.ndarray
+            Array of shape *(N, C)*.
+        """
+        chunks = [softmax(logits, axis=1) for logits, _ in self._forward_batches(images, batch_size)]
+        if not chunks:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.concatenate(chunks, axis=0)
+
+    def analyse_batch(
+        self,
+        images: Sequence[ImageSource],
+        top_k: int = 0,
+        batch_size: Optional[int] = None,
+    ) -> List[FingerAnalysis]:
+        """Batched counterpart of :meth:`analyse`, one result per input item."""
+        results: List[FingerAnalysis] = []
+        for logits, ridge in self._forward_batches(images, batch_size):
+            results.extend(self._decode_batch(logits, ridge, top_k))
+        return results
+
+    def analyse_preprocessed(self, batch: np.ndarray, top_k: int = 0) -> List[FingerAnalysis]:
+        """Analyse an already-prepared batch from :meth:`new_input_buffer`.
+
+        Used by callers that stack their own inputs, such as
+        :class:`~backend.ml.batching.MicroBatcher`; *N* must not exceed
+        ``max_batch_size``.
+        """
+        logits, ridge = self._forward(batch)
+        return self._decode_batch(logits, ridge, top_k)
+
+    # -----------------------------------------------------------------
+    # Internals
+    # -----------------------------------------------------------------
+
+    def _forward(self, x: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Run the session once and return *(class_logits, ridge_out)*.
+
+        ``ridge_out`` is ``None`` when the exported graph has no regression
+        head (it is assumed to be the second output).
+        """
+        if self.io_binding:
+            outputs = self._run_bound(x)
+        else:
+            outputs = self.session.run(None, {self.input_name: x})
+        ridge = outputs[1] if len(outputs) > 1 else None
+        return outputs[0], ridge
+
+    def _outputs_bindable(self) -> bool:
+        """IO binding needs float outputs whose only dynamic axis is the batch."""
+        for output in self.session.get_outputs():
+            if output.type != "tensor(float)":
+                return False
+            if not output.shape or any(not isinstance(d, int) for d in output.shape[1:]):
+                return False
+        return True
+
+    def _run_bound(self, x: np.ndarray) -> List[np.ndarray]:
+        """Run with outputs bound to this thread's buffers for ``len(x)``.
+
+        The returned arrays are reused by the next call on the same thread,
+        so callers must consume them before running again.
+        """
+        cache: Dict[int, Tuple[Any, List[np.ndarray]]] = getattr(self._buffers, "by_batch", None)
+        if cache is None:
+            cache = self._buffers.by_batch = {}
+        n = len(x)
+        if n not in cache:
+            binding = self.session.io_binding()
+            buffers = []
+            for output in self.session.get_outputs():
+                buf = np.empty([n, *output.shape[1:]], dtype=np.float32)
+                binding.bind_output(output.name, "cpu", 0, np.float32, buf.shape, buf.ctypes.data)
+                buffers.append(buf)
+            cache[n] = (binding, buffers)
+        binding, buffers = cache[n]
+        binding.bind_cpu_input(self.input_name, np.ascontiguousarray(x))
+        self.session.run_with_iobinding(binding)
+        return buffers
+
+    def _forward_batches(
+        self, images: Sequence[ImageSource], batch_size: Optional[int]
+    ) -> Iterator[Tuple[np.ndarray, Optional[np.ndarray]]]:
+        """Yield the raw outputs for *images*, one chunk at a time.
+
+        A single input tensor sized for the largest chunk is allocated up front
+        and every chunk is decoded straight into (a leading slice of) it.
+        """
+        batch_size = min(batch_size or self.max_batch_size, self.max_batch_size)
+        total = len(images)
+        if total == 0:
+            return
+        buffer = self.new_input_buffer(min(total, batch_size))
+        for start in range(0, total, batch_size):
+            chunk = images[start:start + batch_size]
+            for i, source in enumerate(chunk):
+                self.prepare_into(source, buffer[i])
+            yield self._forward(buffer[:len(chunk)])
+
+    def _decode_batch(
+        self, logits: np.ndarray, ridge: Optional[np.ndarray], top_k: int
+    ) -> List[FingerAnalysis]:
+        """Split batched output tensors into one :class:`FingerAnalysis` per row."""
+        probs = softmax(logits, axis=1)
+        ridges = ridge.reshape(-1) if ridge is not None else np.zeros(len(probs), dtype=np.float32)
+        return [self._decode(row, float(ridge_count), top_k) for row, ridge_count in zip(probs, ridges)]
+
+    def _decode(self, probs: np.ndarray, ridge_count: float, top_k: int) -> FingerAnalysis:
+        """Turn one probability vector into a :class:`FingerAnalysis`."""
         label = self.INDEX_TO_CLASS.get(int(np.argmax(probs)), "Unknown")
-        # attempt to get regression output
-        try:
-            ridge = self.predict_ridge_count(image_path)
-        except Exception:
-            ridge = 0.0
-        return label, ridge, probs 
\ No newline at end of file
+        ranked: List[Tuple[str, float]] = []
+        if top_k > 0:
+            for index in np.argsort(probs)[::-1][:top_k]:
+                ranked.append((self.INDEX_TO_CLASS.get(int(index), "Unknown"), float(probs[index])))
+        return FingerAnalysis(label, ridge_count, probs, ranked)
@@ -1,5 +1,5 @@
 from collections import OrderedDict
-from typing import Union, Tuple
+from typing import Optional, Union, Tuple
 
 import torch
 import torch.nn as nn
@@ -15,10 +15,12 @@ class MobileNetMultiTask(nn.Module):
     A dropout layer is added before the heads for regularisation.
     """
 
-    def __init__(self, num_classes: int = 12, dropout_rate: float = 0.5):
+    def __init__(self, num_classes: int = 12, dropout_rate: float = 0.5, pretrained: bool = True):
         super().__init__()
-        # Load the ImageNet-pre-trained MobileNet-V2 backbone
-        self.base_model = mobilenet_v2(weights="DEFAULT")
+        # Load the ImageNet-pre-trained MobileNet-V2 backbone.  Pass
+        # ``pretrained=False`` when the weights will be overwritten by a
+        # checkpoint anyway – it avoids a download and works offline.
+        self.base_model = mobilenet_v2(weights="DEFAULT" if pretrained else None)
 
         # Number of features that come out of the backbone
         in_features = self.base_model.classifier[1].in_features
@@ -48,25 +50,51 @@ class MobileNetMultiTask(nn.Module):
 
 def load_checkpoint(
     checkpoint_path: str,
-    num_classes: int = 12,
+    num_classes: Optional[int] = 12,
     device: Union[str, torch.device] = "cpu",
 ) -> nn.Module:
     """Load a *MobileNetMultiTask* model from *checkpoint_path*.
 
     The function automatically removes a leading ``module.`` prefix if the
     weights were saved from a ``nn.DataParallel`` model.
+
+    No pretrained weights are fetched: the architecture is built on the
+    ``meta`` device and the checkpoint tensors, memory-mapped from disk, are
+    assigned to it directly.  Pass ``num_classes=None`` to take the class
+    count from the checkpoint; otherwise it must match the stored heads.
     """
     device = torch.device(device)
-    model = MobileNetMultiTask(num_classes=num_classes)
-    model.to(device)
+    try:
+        state_dict = torch.load(checkpoint_path, map_location="cpu", mmap=True, weights_only=True)
+    except RuntimeError:
+        # Legacy (non-zipfile) checkpoints cannot be memory-mapped
+        state_dict = torch.load(checkpoint_path, map_location="cpu", weights_only=True)
 
-    state_dict = torch.load(checkpoint_path, map_location=device)
     # Remove "module." prefix if present (from DataParallel)
     new_state_dict = OrderedDict()
     for k, v in state_dict.items():
         name = k[7:] if k.startswith("module.") else k
         new_state_dict[name] = v
 
-    model.load_state_dict(new_state_dict, strict=False)
+    class_weight = new_state_dict.get("class_head.weight")
+    ridge_weight = new_state_dict.get("ridge_head.weight")
+    if class_weight is None or ridge_weight is None:
+        raise ValueError(f"{checkpoint_path} has no class_head/ridge_head weights")
+    if num_classes is None:
+        num_classes = class_weight.shape[0]
+    elif class_weight.shape[0] != num_classes:
+        raise ValueError(
+            f"{checkpoint_path} was trained with {class_weight.shape[0]} classes, expected {num_classes}"
+        )
+    if ridge_weight.shape[0] != 1:
+        raise ValueError(f"{checkpoint_path} ridge_head has {ridge_weight.shape[0]} outputs, expected 1")
+
+    with torch.device("meta"):
+        model = MobileNetMultiTask(num_classes=num_classes, pretrained=False)
+    result = model.load_state_dict(new_state_dict, strict=False, assign=True)
+    if result.missing_keys:
+        raise ValueError(f"{checkpoint_path} is missing weights: {', '.join(result.missing_keys[:5])}…")
+
+    model.to(device)
     model.eval()
-    return model 
\ No newline at end of file
+    return model
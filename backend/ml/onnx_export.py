@@ -4,10 +4,31 @@ from typing import Union
 import torch
 from torch import nn
 
-__all__ = ["save_onnx"]
+from .preprocess import IMG_SIZE, MEAN, STD
 
+__all__ = ["RawInputModel", "save_onnx"]
 
-def save_onnx(model: nn.Module, model_path: Union[str, Path]) -> None:
+
+class RawInputModel(nn.Module):
+    """Prepend the inference-time preprocessing to *model*.
+
+    Takes decoded ``uint8`` pixels of shape *(B, H, W, 3)* and performs the
+    cast, scaling to [0, 1], mean/std normalisation and HWC→CHW transpose
+    inside the graph, so callers can feed images straight from the decoder.
+    """
+
+    def __init__(self, model: nn.Module, mean: float = MEAN, std: float = STD):
+        super().__init__()
+        self.model = model
+        self.scale = 1.0 / (255.0 * std)
+        self.shift = mean / std
+
+    def forward(self, x: torch.Tensor):
+        x = x.permute(0, 3, 1, 2).float()
+        return self.model(x * self.scale - self.shift)
+
+
+def save_onnx(model: nn.Module, model_path: Union[str, Path], raw_input: bool = False) -> None:
     """Export *model* to ONNX format.
 
     Parameters
@@ -17,6 +38,10 @@ def save_onnx(model: nn.Module, model_path: Union[str, Path]) -> None:
         to the correct device.
     model_path : str or pathlib.Path
         Destination ``.onnx`` filename.
+    raw_input : bool
+        Wrap *model* in :class:`RawInputModel` so the exported graph accepts
+        uint8 *(B, 224, 224, 3)* pixels instead of a normalised float tensor.
+        ``FingerClassifier`` detects this from the input type.
     """
     model_path = Path(model_path)
 
@@ -24,9 +49,14 @@ def save_onnx(model: nn.Module, model_path: Union[str, Path]) -> None:
     model = model.module if isinstance(model, torch.nn.DataParallel) else model
     model.eval()
 
-    # 2) Dummy input reflecting the training dimensions (1 × 3 × 224 × 224)
+    # 2) Dummy input reflecting the training dimensions (1 × 3 × 224 × 224),
+    #    or raw pixels (1 × 224 × 224 × 3, uint8) when preprocessing is baked in
     device = next(model.parameters()).device
-    dummy_input = torch.randn(1, 3, 224, 224, device=device)
+    if raw_input:
+        model = RawInputModel(model).eval()
+        dummy_input = torch.randint(0, 256, (1, IMG_SIZE, IMG_SIZE, 3), dtype=torch.uint8, device=device)
+    else:
+        dummy_input = torch.randn(1, 3, IMG_SIZE, IMG_SIZE, device=device)
 
     # 3) Export
     torch.onnx.export(
@@ -1,14 +1,74 @@
-from typing import Tuple
+from io import BytesIO
+from pathlib import Path
+from typing import Tuple, Union
 
 import numpy as np
 from PIL import Image
 
-__all__ = ["IMG_SIZE", "preprocess", "softmax"]
+__all__ = [
+    "IMG_SIZE",
+    "ImageSource",
+    "load_image",
+    "pixels_into",
+    "preprocess",
+    "preprocess_into",
+    "softmax",
+]
 
 IMG_SIZE: int = 224
 
+# Per-channel normalisation used during training.
+MEAN: float = 0.5
+STD: float = 0.5
 
-def preprocess(path: str) -> np.ndarray:
+# Anything the inference entry points accept as "an image".
+ImageSource = Union[str, Path, bytes, bytearray, memoryview, np.ndarray, Image.Image]
+
+
+def load_image(source: ImageSource) -> Image.Image:
+    """Decode *source* into a 224×224 RGB :class:`PIL.Image.Image`.
+
+    *source* may be a filesystem path, an encoded image buffer (PNG, JPEG…),
+    a decoded ``uint8`` array of shape *(H, W)* or *(H, W, 3)*, or a PIL
+    image.
+    """
+    if isinstance(source, Image.Image):
+        img = source
+    elif isinstance(source, np.ndarray):
+        img = Image.fromarray(np.ascontiguousarray(source, dtype=np.uint8))
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        img = Image.open(BytesIO(source))
+    else:
+        img = Image.open(source)
+    img = img.convert("RGB")
+    return img.resize((IMG_SIZE, IMG_SIZE), Image.BILINEAR)
+
+
+def preprocess_into(source: ImageSource, out: np.ndarray) -> np.ndarray:
+    """Decode *source* and write the normalised CHW tensor into *out*.
+
+    *out* must be a writable float32 array of shape *(3, IMG_SIZE, IMG_SIZE)*,
+    typically one row of a preallocated batch tensor.  The scale and shift are
+    applied in place so no intermediate float image is allocated.
+    """
+    pixels = np.asarray(load_image(source), dtype=np.uint8)  # (H, W, 3)
+    np.multiply(pixels.transpose(2, 0, 1), 1.0 / (255.0 * STD), out=out, casting="unsafe")
+    out -= MEAN / STD
+    return out
+
+
+def pixels_into(source: ImageSource, out: np.ndarray) -> np.ndarray:
+    """Decode *source* and write its raw RGB pixels into *out*.
+
+    For graphs exported with ``save_onnx(..., raw_input=True)``, which take
+    uint8 *(H, W, 3)* input and normalise inside the graph.  *out* must be a
+    writable uint8 array of shape *(IMG_SIZE, IMG_SIZE, 3)*.
+    """
+    out[...] = np.asarray(load_image(source), dtype=np.uint8)
+    return out
+
+
+def preprocess(path: ImageSource) -> np.ndarray:
     """Load *path* image and produce a normalised CHW float32 array.
 
     The transformation mirrors the preprocessing used during training:
@@ -21,15 +81,9 @@ def preprocess(path: str) -> np.ndarray:
     np.ndarray
         Array of shape *(1, 3, IMG_SIZE, IMG_SIZE)*, dtype *float32*.
     """
-    img = Image.open(path).convert("RGB")
-    img = img.resize((IMG_SIZE, IMG_SIZE), Image.BILINEAR)
-    arr = np.asarray(img, dtype=np.float32) / 255.0  # range 0–1
-    arr = arr.transpose(2, 0, 1)[None, ...]  # (1, 3, H, W)
-
-    mean = np.array([0.5, 0.5, 0.5], dtype=np.float32)[:, None, None]
-    std = np.array([0.5, 0.5, 0.5], dtype=np.float32)[:, None, None]
-
-    return (arr - mean) / std
+    x = np.empty((1, 3, IMG_SIZE, IMG_SIZE), dtype=np.float32)
+    preprocess_into(path, x[0])
+    return x
 
 
 def softmax(logits: np.ndarray, axis: int = 1) -> np.ndarray:
@@ -38,4 +92,4 @@ def softmax(logits: np.ndarray, axis: int = 1) -> np.ndarray:
     shift = logits - np.max(logits, axis=axis, keepdims=True)
     exps = np.exp(shift)
     sums = np.sum(exps, axis=axis, keepdims=True)
-    return exps / sums 
\ No newline at end of file
+    return exps / sums
@@ -0,0 +1,233 @@
+"""INT8 quantisation of the fingerprint ONNX model.
+
+Usage::
+
+    python -m backend.ml.quantize mobilenet_v2_best.onnx \
+        --mode both --calibration-dir calib/ --eval-dir holdout/ --report int8_report.json
+
+Produces ``mobilenet_v2_best.int8-dynamic.onnx`` and/or
+``mobilenet_v2_best.int8-static.onnx`` next to the FP32 model.  Set
+``ML_MODEL_VARIANT`` to ``int8-dynamic`` or ``int8-static`` to serve one.
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    CalibrationMethod,
+    QuantFormat,
+    QuantType,
+    quantize_dynamic,
+    quantize_static,
+)
+from onnxruntime.quantization.shape_inference import quant_pre_process
+
+from .inference import FingerClassifier
+from .session import variant_path
+
+__all__ = [
+    "FingerprintCalibrationReader",
+    "compare_models",
+    "list_images",
+    "quantize_dynamic_model",
+    "quantize_static_model",
+]
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".tif", ".webp"}
+
+
+def list_images(folder: Union[str, Path], limit: Optional[int] = None) -> List[Path]:
+    """Return the image files in *folder* (recursively), sorted by name."""
+    images = sorted(p for p in Path(folder).rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)
+    return images[:limit] if limit else images
+
+
+@contextmanager
+def _prepared(onnx_path: Union[str, Path]) -> Iterator[str]:
+    """Yield a shape-inferred, graph-optimised copy of *onnx_path* for quantisation."""
+    with tempfile.TemporaryDirectory() as tmp:
+        prepared = Path(tmp) / "prepared.onnx"
+        # ONNX shape inference is enough here: only the batch axis is dynamic
+        quant_pre_process(str(onnx_path), str(prepared), skip_symbolic_shape=True)
+        yield str(prepared)
+
+
+class FingerprintCalibrationReader(CalibrationDataReader):
+    """Feed calibration images through the same preprocessing as serving."""
+
+    def __init__(self, onnx_path: Union[str, Path], images: Sequence[Path]):
+        self.classifier = FingerClassifier(onnx_path)
+        self.input_name = self.classifier.input_name
+        self.images = list(images)
+        self._iter: Iterator[Path] = iter(self.images)
+
+    def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+        path = next(self._iter, None)
+        if path is None:
+            return None
+        return {self.input_name: self.classifier.prepare(str(path))}
+
+    def rewind(self) -> None:
+        self._iter = iter(self.images)
+
+
+def quantize_dynamic_model(
+    onnx_path: Union[str, Path], output_path: Optional[Union[str, Path]] = None
+) -> Path:
+    """Write a dynamically quantised (INT8 weights) copy of *onnx_path*."""
+    output_path = Path(output_path or variant_path(onnx_path, "int8-dynamic"))
+    with _prepared(onnx_path) as prepared:
+        quantize_dynamic(prepared, str(output_path), weight_type=QuantType.QInt8)
+    print(f"[ONNX] Saved dynamic INT8 model to {output_path}")
+    return output_path
+
+
+def quantize_static_model(
+    onnx_path: Union[str, Path],
+    calibration_dir: Union[str, Path],
+    output_path: Optional[Union[str, Path]] = None,
+    limit: Optional[int] = 200,
+    method: str = "minmax",
+) -> Path:
+    """Write a statically quantised (QDQ, INT8) copy of *onnx_path*.
+
+    Activation ranges are calibrated on at most *limit* images from
+    *calibration_dir* using *method* (``minmax``, ``entropy`` or
+    ``percentile``).
+    """
+    images = list_images(calibration_dir, limit)
+    if not images:
+        raise ValueError(f"No calibration images found in {calibration_dir}")
+    methods = {
+        "minmax": CalibrationMethod.MinMax,
+        "entropy": CalibrationMethod.Entropy,
+        "percentile": CalibrationMethod.Percentile,
+    }
+
+    output_path = Path(output_path or variant_path(onnx_path, "int8-static"))
+    with _prepared(onnx_path) as prepared:
+        quantize_static(
+            prepared,
+            str(output_path),
+            FingerprintCalibrationReader(onnx_path, images),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True,
+            calibrate_method=methods[method],
+        )
+    print(f"[ONNX] Saved static INT8 model to {output_path} (calibrated on {len(images)} images)")
+    return output_path
+
+
+def compare_models(
+    reference_path: Union[str, Path],
+    candidate_path: Union[str, Path],
+    images: Sequence[Path],
+    profile: str = "latency",
+) -> Dict[str, Any]:
+    """Compare *candidate_path* against the FP32 *reference_path*.
+
+    Reports top-1 agreement overall and per reference class, ridge-count
+    error, single-image latency (decode excluded) and file size.
+    """
+    if not images:
+        raise ValueError("No evaluation images given")
+    reference = FingerClassifier(reference_path, profile=profile)
+    candidate = FingerClassifier(candidate_path, profile=profile)
+
+    def run(classifier: FingerClassifier):
+        inputs = [classifier.prepare(str(path)) for path in images]
+        classifier.analyse_preprocessed(inputs[0])  # warm-up
+        results, timings = [], []
+        for x in inputs:
+            t0 = time.perf_counter()
+            results.append(classifier.analyse_preprocessed(x)[0])
+            timings.append((time.perf_counter() - t0) * 1000.0)
+        return results, np.asarray(timings)
+
+    ref_results, ref_ms = run(reference)
+    cand_results, cand_ms = run(candidate)
+
+    per_class: Dict[str, Dict[str, float]] = {}
+    for ref, cand in zip(ref_results, cand_results):
+        ref_index = int(np.argmax(ref.probabilities))
+        entry = per_class.setdefault(reference.INDEX_TO_CLASS.get(ref_index, f"class_{ref_index}"), {"count": 0, "agree": 0})
+        entry["count"] += 1
+        entry["agree"] += int(ref_index == int(np.argmax(cand.probabilities)))
+
+    ridge_error = np.abs(
+        np.array([r.ridge_count for r in ref_results]) - np.array([c.ridge_count for c in cand_results])
+    )
+
+    def latency(ms: np.ndarray) -> Dict[str, float]:
+        return {
+            "mean_ms": round(float(ms.mean()), 3),
+            "p50_ms": round(float(np.percentile(ms, 50)), 3),
+            "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        }
+
+    total_agree = sum(entry["agree"] for entry in per_class.values())
+    return {
+        "reference": str(reference_path),
+        "candidate": str(candidate_path),
+        "images": len(images),
+        "agreement": round(total_agree / len(images), 4),
+        "per_class_agreement": {
+            label: {"count": entry["count"], "agreement": round(entry["agree"] / entry["count"], 4)}
+            for label, entry in sorted(per_class.items())
+        },
+        "ridge_count_mae": round(float(ridge_error.mean()), 4),
+        "ridge_count_max_error": round(float(ridge_error.max()), 4),
+        "latency": {"reference": latency(ref_ms), "candidate": latency(cand_ms)},
+        "speedup": round(float(ref_ms.mean() / cand_ms.mean()), 2),
+        "size_mb": {
+            "reference": round(Path(reference_path).stat().st_size / 2**20, 2),
+            "candidate": round(Path(candidate_path).stat().st_size / 2**20, 2),
+        },
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Produce INT8 variants of the fingerprint ONNX model.")
+    parser.add_argument("model", help="FP32 .onnx model")
+    parser.add_argument("--mode", choices=["dynamic", "static", "both"], default="both")
+    parser.add_argument("--calibration-dir", help="folder of fingerprint images (required for static)")
+    parser.add_argument("--calibration-limit", type=int, default=200)
+    parser.add_argument("--method", choices=["minmax", "entropy", "percentile"], default="minmax")
+    parser.add_argument("--eval-dir", help="folder of images for the comparison report (default: calibration dir)")
+    parser.add_argument("--eval-limit", type=int, default=200)
+    parser.add_argument("--report", help="write the comparison report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    if args.mode in ("static", "both") and not args.calibration_dir:
+        parser.error("--calibration-dir is required for static quantisation")
+
+    outputs = []
+    if args.mode in ("dynamic", "both"):
+        outputs.append(quantize_dynamic_model(args.model))
+    if args.mode in ("static", "both"):
+        outputs.append(
+            quantize_static_model(args.model, args.calibration_dir, limit=args.calibration_limit, method=args.method)
+        )
+
+    eval_dir = args.eval_dir or args.calibration_dir
+    if not eval_dir:
+        return
+    images = list_images(eval_dir, args.eval_limit)
+    report = {path.name: compare_models(args.model, path, images) for path in outputs}
+    print(json.dumps(report, indent=2))
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, indent=2))
+        print(f"[ONNX] Wrote quantisation report to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
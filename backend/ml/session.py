@@ -0,0 +1,176 @@
+import os
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional, Union
+
+import onnxruntime as ort
+
+__all__ = ["MODEL_VARIANTS", "SESSION_PROFILES", "build_session", "optimized_model_path", "variant_path"]
+
+
+# Named presets for ``ort.SessionOptions``.  Keys mirror the SessionOptions
+# attributes; ``None`` leaves the onnxruntime default in place.
+#
+# * latency     – one request at a time should finish as fast as possible;
+#                 the worker's share of the cores (cores / WEB_CONCURRENCY)
+#                 works on a single forward pass.
+# * throughput  – many workers on one box; each session stays on a single
+#                 thread so N workers map onto N cores without contention.
+# * low_memory  – single thread, no memory arena or pattern pre-planning.
+SESSION_PROFILES: Dict[str, Dict[str, Any]] = {
+    "default": {},
+    "latency": {
+        "intra_op_num_threads": max(1, (os.cpu_count() or 1) // max(1, int(os.getenv("WEB_CONCURRENCY", "1")))),
+        "inter_op_num_threads": 1,
+        "execution_mode": "sequential",
+        "graph_optimization_level": "all",
+    },
+    "throughput": {
+        "intra_op_num_threads": 1,
+        "inter_op_num_threads": 1,
+        "execution_mode": "sequential",
+        "graph_optimization_level": "all",
+        "allow_spinning": False,
+    },
+    "low_memory": {
+        "intra_op_num_threads": 1,
+        "inter_op_num_threads": 1,
+        "execution_mode": "sequential",
+        "graph_optimization_level": "extended",
+        "enable_cpu_mem_arena": False,
+        "enable_mem_pattern": False,
+        "allow_spinning": False,
+    },
+}
+
+_OPT_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+# Highest level whose optimised graph is portable.  "all" adds layout
+# transforms (e.g. NCHWc) tuned to the CPU that ran them, so a cached graph
+# stops at "extended" and the remaining passes run when it is loaded.
+_PORTABLE_LEVEL = "extended"
+
+_EXEC_MODES = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL,
+}
+
+
+# Artifacts produced by ``backend.ml.quantize`` alongside the FP32 model.
+MODEL_VARIANTS = ("fp32", "int8-dynamic", "int8-static")
+
+
+def variant_path(onnx_path: Union[str, Path], variant: str = "fp32") -> Path:
+    """Return the file holding *variant* of *onnx_path*.
+
+    ``fp32`` is *onnx_path* itself; the INT8 variants are siblings such as
+    ``mobilenet_v2_best.int8-static.onnx``.
+    """
+    if variant not in MODEL_VARIANTS:
+        raise ValueError(f"Unknown model variant {variant!r}; expected one of {MODEL_VARIANTS}")
+    onnx_path = Path(onnx_path)
+    if variant == "fp32":
+        return onnx_path
+    return onnx_path.with_name(f"{onnx_path.stem}.{variant}{onnx_path.suffix}")
+
+
+def optimized_model_path(onnx_path: Union[str, Path], level: str = "extended") -> Path:
+    """Return where *onnx_path* optimised at graph *level* is cached.
+
+    ``mobilenet_v2_best.onnx`` optimised at level ``extended`` by onnxruntime
+    1.17.1 is cached as ``mobilenet_v2_best.opt-extended.ort1.17.1.onnx`` in
+    the same directory; fused contrib ops are specific to the runtime
+    version.  Thread counts do not change the graph, so profiles sharing a
+    level share the file.
+    """
+    onnx_path = Path(onnx_path)
+    return onnx_path.with_name(f"{onnx_path.stem}.opt-{level}.ort{ort.__version__}{onnx_path.suffix}")
+
+
+def _session_options(config: Mapping[str, Any]) -> ort.SessionOptions:
+    so = ort.SessionOptions()
+    if config.get("intra_op_num_threads") is not None:
+        so.intra_op_num_threads = int(config["intra_op_num_threads"])
+    if config.get("inter_op_num_threads") is not None:
+        so.inter_op_num_threads = int(config["inter_op_num_threads"])
+    if config.get("execution_mode") is not None:
+        so.execution_mode = _EXEC_MODES[config["execution_mode"]]
+    if config.get("graph_optimization_level") is not None:
+        so.graph_optimization_level = _OPT_LEVELS[config["graph_optimization_level"]]
+    if config.get("enable_cpu_mem_arena") is not None:
+        so.enable_cpu_mem_arena = bool(config["enable_cpu_mem_arena"])
+    if config.get("enable_mem_pattern") is not None:
+        so.enable_mem_pattern = bool(config["enable_mem_pattern"])
+    if config.get("allow_spinning") is not None:
+        so.add_session_config_entry("session.intra_op.allow_spinning", "1" if config["allow_spinning"] else "0")
+    return so
+
+
+def build_session(
+    onnx_path: Union[str, Path],
+    profile: str = "default",
+    overrides: Optional[Mapping[str, Any]] = None,
+    cache_optimized: bool = False,
+) -> ort.InferenceSession:
+    """Create an ``InferenceSession`` for *onnx_path* using a named profile.
+
+    Parameters
+    ----------
+    onnx_path : str or pathlib.Path
+        Source ``.onnx`` model.
+    profile : str
+        Key of :data:`SESSION_PROFILES`.
+    overrides : mapping, optional
+        Per-deployment values that take precedence over the profile, e.g.
+        ``{"intra_op_num_threads": 2}``.
+    cache_optimized : bool
+        Serialise the optimised graph next to *onnx_path* on first load and
+        reuse it on later starts, as long as it is newer than the source
+        model.  The cached graph is optimised at most at level ``extended``,
+        which is portable across CPUs; level ``all`` adds its
+        hardware-specific layout passes each time the cached graph is loaded.
+    """
+    if profile not in SESSION_PROFILES:
+        raise ValueError(f"Unknown session profile {profile!r}; expected one of {sorted(SESSION_PROFILES)}")
+    onnx_path = Path(onnx_path)
+    config = {**SESSION_PROFILES[profile], **(overrides or {})}
+
+    if not cache_optimized or config.get("graph_optimization_level") == "disable":
+        return ort.InferenceSession(str(onnx_path), sess_options=_session_options(config))
+
+    level = config.get("graph_optimization_level") or "all"
+    cache_level = level if level in ("basic", _PORTABLE_LEVEL) else _PORTABLE_LEVEL
+    # Passes beyond the cached level still run when the cached graph is loaded
+    load_config = {**config, "graph_optimization_level": "disable" if level == cache_level else level}
+    cached = optimized_model_path(onnx_path, cache_level)
+    if cached.exists() and cached.stat().st_mtime >= onnx_path.stat().st_mtime:
+        # Already optimised offline – skip the portable graph passes
+        return ort.InferenceSession(str(cached), sess_options=_session_options(load_config))
+
+    # Write to a per-process file first so concurrent workers never load a
+    # half-written model, then move it into place.
+    so = _session_options({**config, "graph_optimization_level": cache_level})
+    tmp = cached.with_name(f"{cached.name}.{os.getpid()}.tmp")
+    so.optimized_model_filepath = str(tmp)
+    try:
+        session = ort.InferenceSession(str(onnx_path), sess_options=so)
+    except Exception as e:  # e.g. read-only model directory
+        print(f"[ML] Could not serialise optimised model to {cached}: {e}")
+        return ort.InferenceSession(str(onnx_path), sess_options=_session_options(config))
+    try:
+        os.replace(tmp, cached)
+    except OSError as e:
+        print(f"[ML] Could not cache optimised model at {cached}: {e}")
+        tmp.unlink(missing_ok=True)
+        source, options = onnx_path, config
+    else:
+        source, options = cached, load_config
+    if level == cache_level:
+        return session
+    # The serialising session stopped at the portable level; load again with
+    # the hardware-specific passes
+    return ort.InferenceSession(str(source), sess_options=_session_options(options))
@@ -44,6 +44,18 @@ interface AnalysisResult {
   [key: string]: any;
 }
 
+interface CaptureQualityResult {
+  usable: boolean;
+  score: number;
+  guidance: string[];
+  foreground_bbox: number[] | null;
+  ridge_period: number;
+  quality_features: Record<string, number>;
+  elapsed_ms: number;
+  within_budget: boolean;
+  [key: string]: any;
+}
+
 const fingerprintService = {
   /**
    * Uploads a fingerprint image and its metadata.
@@ -67,6 +79,29 @@ const fingerprintService = {
     }
   },
 
+  /**
+   * Scores a capture frame without storing it, so a poor capture can be
+   * retaken before it is uploaded and analyzed.
+   * @param image - The captured frame (JPEG or PNG).
+   * @returns A promise that resolves with the score, usability and guidance.
+   */
+  async checkCaptureQuality(image: Blob): Promise<CaptureQualityResult> {
+    const formData = new FormData();
+    formData.append('image', image);
+
+    try {
+      const response = await api.post('/api/fingerprint/capture-quality/', formData, {
+        headers: {
+          'Content-Type': 'multipart/form-data',
+        },
+      });
+      return response.data;
+    } catch (error) {
+      console.error("Capture quality error:", error);
+      throw error;
+    }
+  },
+
   /**
    * Requests analysis for a previously uploaded fingerprint.
    * @param fingerprintId - The ID of the fingerprint to analyze.
@@ -301,6 +301,27 @@ class ApiService {
     }
   }
 
+  // Scores a capture frame without storing it, so poor captures can be
+  // retaken before upload. formData carries the frame as 'image'.
+  async checkCaptureQuality(formData: FormData): Promise<any> {
+    try {
+      const token = await this.getAuthToken();
+      if (!token) throw new Error('No auth token');
+
+      const response = await fetch(`${API_BASE_URL}/fingerprint/capture-quality/`, {
+        method: 'POST',
+        headers: { 'Authorization': `Token ${token}` },
+        body: formData,
+      });
+
+      if (!response.ok) throw new Error('Capture quality check failed');
+      return await response.json();
+    } catch (error) {
+      console.error('Capture quality error:', error);
+      throw error;
+    }
+  }
+
   async analyzeFingerprint(fingerprintId: number): Promise<any> {
     try {
       const token = await this.getAuthToken();